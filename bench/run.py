@@ -0,0 +1,140 @@
+# time the matching and allocation stages on synthetic holdings of several sizes and compare
+# them against a stored baseline, run from the repository root:
+#     python -m bench.run                          # 1k, 10k and 100k rows against bench/baseline.json
+#     python -m bench.run --sizes 1000 10000 --save  # record those sizes as the new baseline
+import argparse
+import json
+import os
+import platform
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from bench.synthetic import make_dataset
+from ffequity.processors.analyst import Analyst
+from ffequity.processors.benchmark import BenchmarkTables
+from ffequity.utils.instrument import Instrument
+
+YEAR = "2016"
+baselinePath = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def run_size(rows, seed, workers):
+    # runs every stage once on a synthetic year of rows stocks and returns the stage records
+    data = make_dataset(rows, seed=seed)
+    instrument = Instrument()
+    analyst = Analyst({}, workers=workers, instrument=instrument)
+    matchedDf = analyst.match_equity(YEAR, data["equity"], data["carbon"])
+    matchedDf = analyst.match_finance(YEAR, matchedDf, data["financial"])
+    analyzedData = analyst.analyze_data({YEAR: matchedDf})
+
+    totalEquity = {YEAR: float(data["equity"].loc[:, "EndingMarketValue"].sum())}
+    benchmark = BenchmarkTables([YEAR], data=analyzedData, totalEquity=totalEquity)
+    with instrument.stage("aggregate_table", YEAR) as counts:
+        benchmark.aggregate_table()
+        counts["rows"] = len(analyzedData[YEAR].index)
+    return instrument.records
+
+
+def measure(sizes, seed, workers=1):
+    # returns a row per size and stage, each size run in a fresh process so its peak memory is its own
+    results = []
+    for rows in sizes:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            records = executor.submit(run_size, rows, seed, workers).result()
+        for record in records:
+            results.append({
+                "size": rows,
+                "stage": record["stage"],
+                "wall": record["wall"],
+                "cpu": record["cpu"],
+                "rows": record.get("rows"),
+                "rowsPerSecond": record.get("rows", 0) / record["wall"] if record["wall"] > 0 else None,
+                "comparisons": record.get("comparisons"),
+                "peakRss": record["peakRss"],
+            })
+    return pd.DataFrame(results, columns=["size", "stage", "wall", "cpu", "rows", "rowsPerSecond", "comparisons",
+                                          "peakRss"])
+
+
+def compare(results, baseline, tolerance, minWall):
+    # returns the results with the baseline wall time and peak memory of each size and stage and
+    # whether either grew by more than tolerance; stages faster than minWall are too noisy to flag
+    stored = baseline.get("sizes", {})
+    baseWall = []
+    basePeak = []
+    for size, stage in zip(results.loc[:, "size"], results.loc[:, "stage"]):
+        record = stored.get(str(size), {}).get(stage, {})
+        baseWall.append(record.get("wall"))
+        basePeak.append(record.get("peakRss"))
+    results = results.assign(baselineWall=pd.to_numeric(pd.Series(baseWall, index=results.index)),
+                             baselinePeakRss=pd.to_numeric(pd.Series(basePeak, index=results.index)))
+    slower = ((results.loc[:, "wall"] > results.loc[:, "baselineWall"] * (1 + tolerance))
+              & (results.loc[:, "wall"] > minWall))
+    larger = results.loc[:, "peakRss"] > results.loc[:, "baselinePeakRss"] * (1 + tolerance)
+    return results.assign(regression=slower | larger)
+
+
+def describe_machine():
+    # the hardware timings were taken on, as they only compare against timings from the same hardware
+    processor = platform.processor()
+    try:
+        with open("/proc/cpuinfo") as fd:
+            models = [line.split(":", 1)[1].strip() for line in fd if line.startswith("model name")]
+        processor = models[0] if models else processor
+    except OSError:  # not linux
+        pass
+    return {"machine": platform.machine(), "processor": processor, "cpus": os.cpu_count()}
+
+
+def save_baseline(results, path):
+    sizes = {}
+    for record in results.to_dict("records"):
+        sizes.setdefault(str(record["size"]), {})[record["stage"]] = {"wall": record["wall"],
+                                                                      "peakRss": record["peakRss"]}
+    baseline = dict(describe_machine(), python=platform.python_version(), pandas=pd.__version__, sizes=sizes)
+    with open(path, 'w') as fd:
+        json.dump(baseline, fd, indent=1, sort_keys=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the matching and allocation stages on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="equity rows per run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic data")
+    parser.add_argument("--workers", type=int, default=1, help="processes used for fuzzy matching")
+    parser.add_argument("--baseline", default=baselinePath, help="json baseline to compare against or save to")
+    parser.add_argument("--save", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed growth before flagging, 0.25 = 25%%")
+    parser.add_argument("--min-wall", type=float, default=0.05, help="seconds below which timings aren't flagged")
+    args = parser.parse_args(argv)
+
+    results = measure(args.sizes, args.seed, workers=args.workers)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(results.to_string(index=False))
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fd:
+            baseline = json.load(fd)
+    else:
+        print(f"No baseline at {args.baseline}, run with --save to record one")
+    recorded = {key: baseline.get(key) for key in describe_machine()}
+    if baseline and recorded != describe_machine():
+        print(f"The baseline was recorded on {recorded}, not this machine's {describe_machine()}; "
+              "timings will differ, run with --save to record a baseline here")
+    results = compare(results, baseline, args.tolerance, args.min_wall)
+    print(results.to_string(index=False))
+    regressions = results.loc[results.loc[:, "regression"]]
+    for record in regressions.to_dict("records"):
+        print(f"Regression: {record['stage']} at {record['size']} rows took {record['wall']:.3f}s "
+              f"against {record['baselineWall']:.3f}s, peak memory {record['peakRss']} against "
+              f"{record['baselinePeakRss']}")
+    return 1 if len(regressions.index) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+
+# carbon companies from the sample data, extended with generated names up to the size asked for
+KNOWN_COMPANIES = ["CONSOL Energy", "Arch Coal", "Cloud Peak Energy", "Natural Resource Partners", "SunCoke Energy",
+                   "Coal India", "Royal Dutch Shell", "ConocoPhillips", "ENI", "BP", "Hess", "Peabody Energy",
+                   "Alpha Natural Resources", "Exxon Mobil", "Chevron", "Occidental Petroleum", "Devon Energy",
+                   "Anadarko Petroleum", "Apache", "Marathon Oil", "Gazprom", "Rosneft", "Lukoil", "PetroChina",
+                   "Petrobras", "Statoil", "Total", "BHP Billiton", "Glencore", "Anglo American"]
+NAME_WORDS = ["Atlantic", "Pacific", "Northern", "Southern", "Western", "Eastern", "Great", "Plains", "River",
+              "Valley", "Mountain", "Basin", "Delta", "Summit", "Pioneer", "Frontier", "Continental", "National",
+              "United", "American", "Canadian", "Global", "Royal", "Imperial", "Pinnacle", "Ridge", "Harbor"]
+SECTOR_WORDS = ["Energy", "Coal", "Oil", "Gas", "Petroleum", "Resources", "Mining", "Minerals", "Exploration",
+                "Power", "Fuels", "Hydrocarbons"]
+# other stocks are named from their own words, as few real holdings share a word with a carbon company
+OTHER_PREFIXES = ["Apex", "Blue", "Bright", "Cedar", "Crescent", "Evergreen", "First", "Granite", "Harmony", "Horizon",
+                  "Liberty", "Maple", "Nova", "Orion", "Quantum", "Silver", "Sterling", "Urban", "Vertex", "Zenith"]
+OTHER_WORDS = ["Clothing", "Apparel", "Pear", "Software", "Systems", "Foods", "Retail", "Pharma", "Biotech",
+               "Semiconductor", "Networks", "Bank", "Insurance", "Media", "Airlines", "Hotels", "Wigs", "Toys"]
+SUFFIXES = ["", "", "INC", "CORP", "LTD", "PLC", "CO", "CLASS A", "CLASS B", "STOCK A", "OPTION B", "ADR", "SA",
+            "A", "B"]
+ABBREVIATIONS = {"RESOURCES": "RES", "ENERGY": "ENRGY", "PETROLEUM": "PETE", "NATURAL": "NAT", "INTERNATIONAL": "INTL",
+                 "EXPLORATION": "EXPL", "CORPORATION": "CORP", "AMERICAN": "AMER", "MINING": "MNG"}
+FUELS = ["Coal", "Oil", "Gas"]
+
+
+def carbon_names(count, rng):
+    # returns count distinct carbon company names, the known ones first
+    names = list(KNOWN_COMPANIES[:count])
+    seen = set(names)
+    while len(names) < count:
+        name = f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(SECTOR_WORDS)}"
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def noisy_name(name, rng):
+    # returns the way a custodian might list a stock of the company called name: upper case,
+    # with share classes and legal forms added, words abbreviated, joined or misspelled
+    words = name.upper().split()
+    if rng.random_sample() < 0.3:
+        words = [ABBREVIATIONS.get(word, word) for word in words]
+    if len(words) > 1 and rng.random_sample() < 0.1:
+        position = rng.randint(len(words) - 1)
+        words[position:position + 2] = [words[position] + words[position + 1]]
+    if rng.random_sample() < 0.1:
+        position = rng.randint(len(words))
+        word = words[position]
+        if len(word) > 4:
+            cut = rng.randint(1, len(word) - 1)
+            words[position] = word[:cut] + word[cut + 1:]  # a dropped letter
+    suffix = SUFFIXES[rng.randint(len(SUFFIXES))]
+    return " ".join(words + ([suffix] if suffix else []))
+
+
+def other_name(rng):
+    # returns the name of a stock that is not a fossil fuel company
+    suffix = SUFFIXES[rng.randint(len(SUFFIXES))]
+    return f"{rng.choice(OTHER_PREFIXES)} {rng.choice(OTHER_WORDS)} {suffix}".strip().upper()
+
+
+def make_carbon(companies, rng):
+    # returns carbon data with Coal, Oil and Gas reserves for each company, most holding one or two fuels
+    reserves = {}
+    for fuel in FUELS:
+        held = rng.random_sample(len(companies)) < 0.45
+        reserves[fuel + "(GtCO2)"] = np.where(held, rng.lognormal(0.0, 1.5, len(companies)).round(3), 0.0)
+    return pd.DataFrame(dict({"Company(Company)": companies}, **reserves),
+                        columns=["Company(Company)"] + [fuel + "(GtCO2)" for fuel in FUELS])
+
+
+def make_equity(rows, companies, rng, fossilShare=0.1):
+    # returns equity data with rows stocks, fossilShare of them noisy listings of the carbon companies
+    fossil = rng.random_sample(rows) < fossilShare
+    heldCompanies = rng.randint(len(companies), size=rows)
+    stocks = [noisy_name(companies[company], rng) if isFossil else other_name(rng)
+              for isFossil, company in zip(fossil, heldCompanies)]
+    marketValues = rng.lognormal(14.0, 2.0, rows).round(0)
+    return pd.DataFrame({"Stocks": stocks, "EndingMarketValue": marketValues}, columns=["Stocks", "EndingMarketValue"])
+
+
+def make_financial(companies, rng, missingShare=0.05):
+    # returns market caps in billions for the companies, leaving missingShare of them out
+    known = rng.random_sample(len(companies)) >= missingShare
+    marketCaps = rng.lognormal(2.0, 1.5, len(companies)).round(2)
+    return pd.DataFrame({"Company(Company)": np.asarray(companies)[known], "MarketCap(B)": marketCaps[known]},
+                        columns=["Company(Company)", "MarketCap(B)"])
+
+
+def make_dataset(rows, seed=0, carbonCompanies=200, fossilShare=0.1):
+    # returns {"equity", "carbon", "financial"} frames for one year, the same for the same seed
+    rng = np.random.RandomState(seed)
+    companies = carbon_names(carbonCompanies, rng)
+    return {
+        "equity": make_equity(rows, companies, rng, fossilShare=fossilShare),
+        "carbon": make_carbon(companies, rng),
+        "financial": make_financial(companies, rng),
+    }
@@ -1,9 +1,19 @@
 # mimic ffequity.py in process but do it for carbon allocation
 from utils.dataframefile import DataFrameFile
+from utils.instrument import Instrument
+from utils.runmanifest import RunManifest
 from processors.validator import Validator
+from processors.schema import Schema
 from processors.analyst import Analyst
 
+cacheDir = './data/cache'  # parsed csv files kept between runs
+readWorkers = 1  # raise to read that many csv files at once
 folderNames = ['assessment', 'financial_data']
+yearWorkers = 1  # raise to allocate that many years at once
+runManifestPath = './data/runmanifest.json'  # inputs of each year's outputs, so unchanged years are reused
+instrumentPath = './data/instrument.json'  # time and memory of each stage of the last run
+storePath = None  # set to './data/results.sqlite' to also load every output into an indexed SQLite store
+portfolio = ''  # the client this data folder belongs to, which its rows in the store are kept under
 
 def main():
     # create object instance of DataFrameFile
@@ -11,15 +21,18 @@ def main():
     # run the fair share allocation for each year
     # write the final data to .csv in benchmark
     # create object instance of dataframefile and validator
-    dataframefile = DataFrameFile()
+    instrument = Instrument()
+    dataframefile = DataFrameFile(cacheDir=cacheDir, store=storePath, portfolio=portfolio)
     # read in the assessment datafiles and the financial datafiles
-    validator = Validator(folderNames)
+    validator = Validator(folderNames, workers=readWorkers, schema=Schema(), instrument=instrument)
 
     # tell validator to use dataframefile to validate all data and read into dfs
     dfs = validator.validate(dataframefile)
     # create analyst object and pass in dfs to be written out to master spreadsheets
-    analyst = Analyst(dfs)
+    analyst = Analyst(dfs, yearWorkers=yearWorkers,
+                      runManifest=RunManifest(runManifestPath), instrument=instrument)
     analyst.analyze_carbon(dataframefile)
+    instrument.to_json(instrumentPath)
     print("Congratulations, the tool has completed the analysis!")
 
 if __name__ == "__main__":
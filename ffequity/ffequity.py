@@ -1,20 +1,40 @@
 from utils.dataframefile import DataFrameFile
+from utils.instrument import Instrument
+from utils.runmanifest import RunManifest
+from utils.matchcache import MatchCache
 from processors.validator import Validator
+from processors.schema import Schema
 from processors.analyst import Analyst
 
+cacheDir = './data/cache'  # parsed csv files kept between runs
+readWorkers = 1  # raise to read that many csv files at once
+aggregateEquity = False  # set to True to collapse lot-level equity files to one row per stock while reading
 folderNames = ['equity_data', 'carbon_data']
+matchWorkers = 1  # raise to spread fuzzy matching across that many processes
+yearWorkers = 1  # raise to match that many years at once
+matchCachePath = './data/matchcache.pkl'
+runManifestPath = './data/runmanifest.json'  # inputs of each year's outputs, so unchanged years are reused
+instrumentPath = './data/instrument.json'  # time and memory of each stage of the last run
+storePath = None  # set to './data/results.sqlite' to also load every output into an indexed SQLite store
+portfolio = ''  # the client this data folder belongs to, which its rows in the store are kept under
 
 def main():
     # create object instance of dataframefile and validator
-    dataframefile = DataFrameFile()
-    validator = Validator(folderNames)
+    instrument = Instrument()
+    dataframefile = DataFrameFile(cacheDir=cacheDir, store=storePath, portfolio=portfolio)
+    validator = Validator(folderNames, workers=readWorkers, schema=Schema(), aggregateEquity=aggregateEquity,
+                          instrument=instrument)
 
     # tell validator to use dataframefile to validate all data and read into dfs
     dfs = validator.validate(dataframefile)
 
     # create analyst object and pass in dfs to be written out to master spreadsheets
-    analyst = Analyst(dfs)
+    # reuse the fuzzy match scores from previous runs
+    matchCache = MatchCache(matchCachePath)
+    analyst = Analyst(dfs, workers=matchWorkers, matchCache=matchCache, yearWorkers=yearWorkers,
+                      runManifest=RunManifest(runManifestPath), instrument=instrument)
     analyst.analyze_equity(dataframefile)
+    instrument.to_json(instrumentPath)
     #print("Congratulations, the tool has completed the analysis!")
 
 if __name__ == "__main__":
@@ -1,56 +1,244 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import numpy as np
 import pandas as pd
-from fuzzywuzzy import fuzz
+
+from .matcher import SCORER_VERSION, Matcher, normalize_names
+from .panel import keys_by_year
+
+try:
+    from ..utils.instrument import stage
+except (ImportError, ValueError):  # the scripts import processors and utils as top-level packages
+    from utils.instrument import stage
+
+# bump when a change to the analysis changes its outputs, so incremental runs redo every year
+ANALYSIS_VERSION = "1"
 
 
 class AnalystException(Exception):
     pass
 
 
+def _run_year(analyst, method, year, args):
+    # runs one year's work on the copy of analyst sent to a worker process and returns
+    # the result with the statistics and match scores the main process should keep
+    if analyst.matchCache is not None:
+        analyst.matchCache.added = []
+    if analyst.instrument is not None:
+        analyst.instrument.records = []
+    result = getattr(analyst, method)(year, *args)
+    added = analyst.matchCache.added if analyst.matchCache is not None else []
+    records = analyst.instrument.records if analyst.instrument is not None else []
+    return result, analyst.matchStats.get(year), analyst.financeStats.get(year), added, records
+
+
 class Analyst:
     """Analyst performs risk computations on the data within data structures"""
-    def __init__(self, dfs):
+    def __init__(self, dfs, thresh=90, workers=1, chunkSize=64, matchCache=None, marketCapDuplicates="first",
+                 yearWorkers=1, yearExecutor="thread", runManifest=None, instrument=None):
+        if yearExecutor not in ("thread", "process"):
+            raise AnalystException(f"yearExecutor must be thread or process: {yearExecutor}")
         self.dfs = dfs
+        self.yearWorkers = yearWorkers  # number of years matched, allocated and written at once
+        self.yearExecutor = yearExecutor  # run the years on threads or on processes
+        self.matchCache = matchCache  # scores carried over from earlier runs and years
+        self.thresh = thresh  # minimum fuzzy match ratio for a stock to be linked to a carbon company
+        self.workers = workers  # number of processes used to score carbon companies
+        self.chunkSize = chunkSize  # number of carbon companies sent to a worker at a time
+        self.matchStats = {}  # stock rows resolved by each matching stage, by year
+        # which market cap a company listed more than once in the financial data gets:
+        # "first", "last", "mean", or "raise" to refuse the data
+        self.marketCapDuplicates = marketCapDuplicates
+        self.financeStats = {}  # carbon companies with and without a market cap, by year
+        # what each year's written outputs were computed from, anything with is_current(), record(),
+        # hash_input() and save(); None reruns every year
+        self.runManifest = runManifest
+        # records the time and memory of each stage, anything with stage(name, year) and merge(); None to skip
+        self.instrument = instrument
+
+    def __getstate__(self):
+        # a worker process is sent the frames of its own year with the task, not all of dfs
+        state = self.__dict__.copy()
+        state["dfs"] = {}
+        return state
+
+    def run_years(self, method, tasks):
+        # returns {year: self.<method>(year, *args)} for every year and args in tasks, running
+        # up to self.yearWorkers years at once; results are collected in year order either way
+        years = sorted(tasks)
+        if self.yearWorkers == 1 or len(years) <= 1:
+            return {year: getattr(self, method)(year, *tasks[year]) for year in years}
+
+        results = {}
+        if self.yearExecutor == "thread":
+            with ThreadPoolExecutor(max_workers=self.yearWorkers) as executor:
+                futures = {year: executor.submit(getattr(self, method), year, *tasks[year]) for year in years}
+                for year in years:
+                    results[year] = futures[year].result()
+            return results
+
+        with ProcessPoolExecutor(max_workers=self.yearWorkers) as executor:
+            futures = {year: executor.submit(_run_year, self, method, year, tasks[year]) for year in years}
+            for year in years:
+                results[year], matchStats, financeStats, added, records = futures[year].result()
+                # keep what the worker recorded on its copy of the analyst
+                if matchStats is not None:
+                    self.matchStats[year] = matchStats
+                if financeStats is not None:
+                    self.financeStats[year] = financeStats
+                for key, matchRatio in added:
+                    self.matchCache.put(key, matchRatio)
+                if records:
+                    self.instrument.merge(records)
+        return results
+
+    def write_years(self, dataframefile, frames, suffix, path):
+        # write each year's frame to path/<year><suffix>.csv, several years at once when
+        # running years in parallel since the writes don't touch dataframefile.data
+        if self.yearWorkers == 1:
+            for year in sorted(frames):
+                self.write_year(dataframefile, year, frames[year], suffix, path)
+            return
+        with ThreadPoolExecutor(max_workers=self.yearWorkers) as executor:
+            futures = [executor.submit(self.write_year, dataframefile, year, frames[year], suffix, path)
+                       for year in sorted(frames)]
+            for future in futures:
+                future.result()
+
+    def write_year(self, dataframefile, year, data, suffix, path):
+        with stage(self.instrument, "write", year) as counts:
+            counts.update(rows=len(data.index), file=year + suffix + ".csv")
+            dataframefile.write(year + suffix, path=path, data=data)
 
-    def analyze_equity(self, dataframefile):
+    def analyze_equity(self, dataframefile, write=True, years=None):
         # analyze will match the available data and then compute summary statistics
         # first, get the years that the user has requested
-        years = sorted(set([key[:4] for key in self.dfs]))
+        if years is None:
+            years = list(keys_by_year(self.dfs))
+        fingerprints = {}
+        if write:
+            # only match the years whose equity or carbon data changed since their assessment was written
+            years, fingerprints = self.stale_years("assessment", years, ["equity_data", "carbon_data"],
+                                                   "./data/assessment/", "assessment", dataframefile)
         matchedData = self.match_data(years)
-        # write the matched files to /assessment/
-        for year in matchedData:
-            dataframefile.data = matchedData[year]
-            dataframefile.write(year+'assessment', path="./data/assessment/")
-            companyNames = pd.DataFrame(dataframefile.data.loc[:, "Company(Company)"])
-            companyNames = companyNames[companyNames.loc[:, "Company(Company)"].notnull()]
-            companyNames["MarketCap(B)"] = None
-            dataframefile.data = companyNames
-            dataframefile.write(year+'MarketCaps', path="./data/financial_data/")
+        # write the matched files to /assessment/ along with MarketCaps files for the user to fill in
+        if write:
+            self.write_assessment(dataframefile, matchedData)
+            self.write_market_caps(dataframefile, matchedData)
+            self.record_years("assessment", matchedData, fingerprints, "./data/assessment/", "assessment")
+        return matchedData
 
-    def analyze_carbon(self, dataframefile):
+    def analyze_carbon(self, dataframefile, matchedData=None, write=True):
+        # use the matched data passed in, or else the assessment files read into dfs
+        fingerprints = {}
+        if matchedData is None:
+            years = list(keys_by_year(self.dfs, "assessment"))
+            if write:
+                # only allocate the years whose assessment or financial data changed since the last run
+                years, fingerprints = self.stale_years("benchmarks", years, ["assessment", "financial_data"],
+                                                       "./data/benchmarks/", "benchmarks", dataframefile)
+            matchedData = {year: self.dfs[year + "assessment"] for year in years}
         # get the years
-        years = sorted(set([key[:4] for key in self.dfs]))
+        years = sorted(matchedData)
         # check if the user has financial data for this year
-        completeData = {}
+        tasks = {}
         for year in years:
-            completeData[year] = self.dfs[year + "assessment"]
             try:
                 financial = self.dfs[year+"financial_data"]
             except KeyError:
                 print(f"No financial data for {year}, will not compute fair-share allocation")
-                continue
-            # if the user has financial data, update the matched data to include it
-            completeData[year] = self.match_finance(year, completeData[year], financial)
+                financial = None
+            tasks[year] = (matchedData[year], financial)
 
+        # update the matched data to include the financial data and
         # compute carbon held if there was financial data provided
-        analyzedData = self.analyze_data(completeData)
+        analyzedData = self.run_years("allocate_year", tasks)
         # write fossil fuel assessment to CSV files in /benchmarks
-        for year in analyzedData:
-            dataframefile.data = analyzedData[year]
-            dataframefile.write(year+'benchmarks', path="./data/benchmarks/")
+        if write:
+            self.write_years(dataframefile, analyzedData, 'benchmarks', "./data/benchmarks/")
+            self.record_years("benchmarks", analyzedData, fingerprints, "./data/benchmarks/", "benchmarks")
+        return analyzedData
+
+    def allocate_year(self, year, matchedDf, financial):
+        # if the user has financial data, update the matched data to include it
+        if financial is not None:
+            matchedDf = self.match_finance(year, matchedDf, financial)
+        return self.analyze_year(year, matchedDf)
+
+    def analyze_pipeline(self, dataframefile, writeAssessment=False):
+        # match the equity and carbon data and run the fair-share allocation against the
+        # financial data already in dfs, handing the matched data over in memory
+        # only the years whose equity, carbon or financial data changed since the last run are redone
+        years = list(keys_by_year(self.dfs))
+        years, fingerprints = self.stale_years("pipeline", years, ["equity_data", "carbon_data", "financial_data"],
+                                               "./data/benchmarks/", "benchmarks", dataframefile)
+        matchedData = self.analyze_equity(dataframefile, write=False, years=years)
+        if writeAssessment:
+            self.write_assessment(dataframefile, matchedData)
+        analyzedData = self.analyze_carbon(dataframefile, matchedData=matchedData)
+        self.record_years("pipeline", analyzedData, fingerprints, "./data/benchmarks/", "benchmarks")
+        return analyzedData
+
+    def fingerprint(self, year, folders, dataframefile=None):
+        # describes everything a year's output is computed from: the data it was given, how
+        # Validator read it, and the code versions and settings that change the results,
+        # along with the store dataframefile loads the output into and the portfolio it is stored under
+        fingerprint = {folder: self.runManifest.hash_input(self.dfs, year + folder)
+                       for folder in folders if year + folder in self.dfs}
+        readSettings = getattr(self.dfs, "read_settings", None)
+        if readSettings is not None:
+            fingerprint.update(readSettings())
+        fingerprint.update({"analysis": ANALYSIS_VERSION, "scorer": SCORER_VERSION, "thresh": self.thresh,
+                            "marketCapDuplicates": self.marketCapDuplicates})
+        store = getattr(dataframefile, "store", None)
+        if store is not None:
+            fingerprint["store"] = os.path.abspath(store)
+            fingerprint["portfolio"] = getattr(dataframefile, "portfolio", "")
+        return fingerprint
+
+    def stale_years(self, stage, years, folders, path, suffix, dataframefile=None):
+        # returns the years whose path/<year><suffix>.csv has to be recomputed from the data
+        # in folders, and the fingerprints to record once they are written; with a store turned
+        # on since the last run, or since deleted, every year is recomputed to fill it
+        if self.runManifest is None:
+            return list(years), {}
+        fingerprints = {year: self.fingerprint(year, folders, dataframefile) for year in years}
+        store = getattr(dataframefile, "store", None)
+        storeMissing = store is not None and not os.path.exists(store)
+        stale = []
+        for year in years:
+            outputPath = os.path.join(path, year + suffix + ".csv")
+            if not storeMissing and self.runManifest.is_current(stage, year, fingerprints[year], outputPath):
+                print(f"{year}{suffix} is up to date, reusing it")
+            else:
+                stale.append(year)
+        return stale, fingerprints
+
+    def record_years(self, stage, years, fingerprints, path, suffix):
+        # remember what the years just written were computed from, skipping any
+        # written from data handed over in memory, which has no fingerprint
+        if self.runManifest is None:
+            return
+        for year in sorted(set(years) & set(fingerprints)):
+            self.runManifest.record(stage, year, fingerprints[year], os.path.join(path, year + suffix + ".csv"))
+        self.runManifest.save()
+
+    def write_assessment(self, dataframefile, matchedData):
+        self.write_years(dataframefile, matchedData, 'assessment', "./data/assessment/")
+
+    def write_market_caps(self, dataframefile, matchedData):
+        # write the matched company names for the user to fill in their market caps
+        marketCaps = {}
+        for year in matchedData:
+            companyNames = pd.DataFrame(matchedData[year].loc[:, "Company(Company)"])
+            companyNames = companyNames[companyNames.loc[:, "Company(Company)"].notnull()]
+            companyNames["MarketCap(B)"] = None
+            marketCaps[year] = companyNames
+        self.write_years(dataframefile, marketCaps, 'MarketCaps', "./data/financial_data/")
 
     def match_data(self, years):
-        matchedData = {}
+        tasks = {}
         for year in years:
             # check if the user has equity data for this year
             try:
@@ -66,81 +254,127 @@ class Analyst:
                 print(f"No carbon data for {year}, will not match")
                 continue
             # if the user has both equity and carbon data, match them
-            matchedData[year] = self.match_equity(year, equity, carbon)
-
+            tasks[year] = (equity, carbon)
+        matchedData = self.run_years("match_equity", tasks)
 
+        # keep the scores so the next year and the next run only score unseen name pairs
+        if self.matchCache is not None:
+            self.matchCache.save()
         return matchedData
 
     def match_equity(self, year, equity, carbon):
-        # will return a dataframe with the matched data
-        # first, instantiate the matched dataframe from the equity index
-        # and the columns from both data files
-        allColumns = [x for x in equity.columns] + [y for y in carbon.columns]
-        # remove duplicate values from allColumns, order doesn't matter
-        allColumns = set(allColumns)
-        # create matchedDf with columns of all three data sets
-        matchedDf = pd.DataFrame(index=range(len(equity.index)), columns=allColumns)
-        # populate Stocks column for pd.merge(left, right, on='Stocks')
-        matchedDf.Stocks = equity.Stocks
-
+        # will return a dataframe with the equity data and the data of the
+        # carbon company each stock matched, aligned to the equity rows
         # get a list of carbon comapnies and equity stock names for matching
-        carbonCompanies = [x for x in carbon.loc[:, 'Company(Company)']]
-        equityCompanies = [x for x in equity.loc[:, 'Stocks']]
+        with stage(self.instrument, "match_equity", year) as counts:
+            carbonCompanies = [x for x in carbon.loc[:, 'Company(Company)']]
+            equityCompanies = [x for x in equity.loc[:, 'Stocks']]
 
-        # iterate through all of the carbon companies first, because the user
-        # is trying to see if a stock is on the carbon list
-        for carbonCompany in carbonCompanies:
-            bestStocks = [] # create a place to store best matches
+            # stocks whose normalized name equals a carbon company's are resolved by a hash join,
+            # leaving only the residue to be fuzzy matched
+            exactPairs = self.match_exact(equity, carbon)
+            resolved = set(exactPairs.loc[:, "position"])
+            residue = [position for position in range(len(equityCompanies)) if position not in resolved]
+
+            # index the residue stock names once so each carbon company is only scored against
+            # the stocks that share a token or character n-gram with it
             # for now, using edit distance w/90% match threshhold
             # in the future, would recommend cosine similarity to catch abbreviations
-            for equityCompany in equityCompanies:
-                matchRatio = fuzz.partial_token_set_ratio(equityCompany, carbonCompany)
-                thresh = 90
-                if matchRatio < thresh:
-                    continue
-                else:
-                    bestStocks.append(equityCompany)
+            matcher = Matcher([equityCompanies[position] for position in residue], thresh=self.thresh,
+                              cache=self.matchCache)
+            allMatches = matcher.match_all(carbonCompanies, workers=self.workers, chunkSize=self.chunkSize)
 
-                # if there are no matches to the carbon company, then move on
-                if len(bestStocks) == 0:
-                    continue
-                else:
-                    # grab the data row from carbonCompanies for current carbonCompany
-                    carbonRow = carbon['Company(Company)'] == carbonCompany
-                    carbonValues = carbon[carbonRow]
-
-                    # iterate if there are multiple stock options in one company
-                    for equityCompany in bestStocks:
-                        # pull the index matching the stock in matchedDf for updating and align indices
-                        carbonValues.index = matchedDf[matchedDf['Stocks'] == equityCompany].index # ValueError
-                        # the above error occurs when a company has a duplicate row in both the Coal AND Oil and Gas
-                        # update matchedDf with both carbon data
-                        matchedDf.update(carbonValues)
-
-        matchedDf.update(equity)  # index is already aligned to equity
-        print(f"{year} complete...")
+            # collect every accepted match as an (equity row, carbon row, score) pair
+            fuzzyPairs = [(residue[position], order, matchRatio)
+                          for order, matches in enumerate(allMatches) for position, matchRatio in matches]
+            fuzzyPairs = pd.DataFrame(fuzzyPairs, columns=["position", "order", "score"])
+            fuzzyResolved = set(fuzzyPairs.loc[:, "position"])
+            pairs = pd.concat([exactPairs, fuzzyPairs], ignore_index=True)
+
+            matchedDf = self.join_pairs(equity, carbon, pairs)
+            # record how many stock rows each stage resolved
+            self.matchStats[year] = {
+                "exact": len(resolved),
+                "fuzzy": len(fuzzyResolved),
+                "unmatched": len(equityCompanies) - len(resolved) - len(fuzzyResolved),
+                "comparisons": matcher.comparisons,
+            }
+            counts.update(self.matchStats[year], rows=len(equityCompanies))
+            print(f"{year} complete... {len(resolved)} stocks matched exactly, {len(fuzzyResolved)} by fuzzy match")
+            return matchedDf
+
+    def match_exact(self, equity, carbon):
+        # returns the equity row position, carbon row order and score of every stock
+        # whose normalized name equals a carbon company's normalized name
+        equityKeys = pd.DataFrame({"position": range(len(equity.index)),
+                                   "key": normalize_names(equity.loc[:, "Stocks"]).values})
+        carbonKeys = pd.DataFrame({"order": range(len(carbon.index)),
+                                   "key": normalize_names(carbon.loc[:, "Company(Company)"]).values})
+        exactPairs = equityKeys[equityKeys.loc[:, "key"] != ""].merge(carbonKeys, on="key", how="inner")
+        exactPairs["score"] = 100
+        return exactPairs.loc[:, ["position", "order", "score"]].sort_values(["position", "order"])
+
+    def join_pairs(self, equity, carbon, pairs):
+        # returns the equity rows with the carbon data of their matched company in a single join
+        # a stock keeps its best scoring carbon company, and on a tie the later one in the carbon
+        # data as when each match overwrote the last
+        pairs = pairs.sort_values(["position", "score", "order"]).drop_duplicates("position", keep="last")
+        companies = carbon.loc[:, "Company(Company)"].values[pairs.loc[:, "order"].values]
+
+        # combine duplicate rows of one company, such as a row for its Coal and a row for its
+        # Oil and Gas reserves, by summing the numbers and keeping the first of everything else
+        carbonColumns = [col for col in carbon.columns if col not in equity.columns]
+        grouped = carbon.loc[:, carbonColumns].groupby(carbon.loc[:, "Company(Company)"], sort=False)
+        numeric = [col for col in carbonColumns if pd.api.types.is_numeric_dtype(carbon[col])]
+        other = [col for col in carbonColumns if col not in numeric and col != "Company(Company)"]
+        combined = pd.concat([grouped[other].first(), grouped[numeric].sum(min_count=1)], axis=1)
+
+        matchedDf = equity.reset_index(drop=True)
+        matchedDf["Company(Company)"] = pd.Series(companies, index=pairs.loc[:, "position"].values)
+        matchedDf = matchedDf.join(combined.loc[:, [col for col in carbonColumns if col in combined.columns]],
+                                   on="Company(Company)")
         return matchedDf
 
     def match_finance(self, year, matchedDf, financial):
-        # create a new column in matchedDf to include MktCap
-        matchedDf["MarketCap(B)"] = None
-        # iterate through the carbon company names in matchedDf
-        carbonCompanies = matchedDf.loc[matchedDf.loc[:, "Company(Company)"].notnull()].loc[:, "Company(Company)"]
-        for carbonCompany in carbonCompanies:
-            # check if carbon company is in financial list
-            if carbonCompany in financial.loc[:, "Company(Company)"].values:
-                # get financial data linked to the company
-                financialRow = financial.loc[:, 'Company(Company)'] == carbonCompany
-                financialData = financial[financialRow].loc[:, "MarketCap(B)"].values[0]
-                matchedRow = matchedDf.loc[:, "Company(Company)"] == carbonCompany
-                matchedDf.loc[matchedRow, "MarketCap(B)"] = financialData
+        # create a new column in matchedDf with each carbon company's MktCap,
+        # looked up by company name rather than scanning financial per company
+        with stage(self.instrument, "match_finance", year) as counts:
+            marketCaps = self.market_caps(financial)
+            matchedDf["MarketCap(B)"] = matchedDf.loc[:, "Company(Company)"].map(marketCaps)
 
-        return matchedDf
+            # count the matched carbon companies the financial data has no row for
+            carbonCompanies = pd.Series(matchedDf.loc[:, "Company(Company)"].dropna().unique())
+            unmatched = int((~carbonCompanies.isin(marketCaps.index)).sum())
+            self.financeStats[year] = {"matched": len(carbonCompanies) - unmatched, "unmatched": unmatched}
+            counts.update(self.financeStats[year], rows=len(matchedDf.index))
+            if unmatched > 0:
+                print(f"No financial data for {unmatched} of {len(carbonCompanies)} companies in {year}")
+            return matchedDf
+
+    def market_caps(self, financial):
+        # returns the market caps as a Series indexed by company, with companies that
+        # have several rows resolved by self.marketCapDuplicates
+        marketCaps = financial.loc[financial.loc[:, "Company(Company)"].notnull(), ["Company(Company)", "MarketCap(B)"]]
+        duplicates = marketCaps.loc[:, "Company(Company)"].duplicated()
+        if self.marketCapDuplicates == "raise" and duplicates.any():
+            companies = ", ".join(marketCaps.loc[duplicates, "Company(Company)"].unique())
+            raise AnalystException(f"Financial data has more than one market cap for: {companies}")
+        elif self.marketCapDuplicates in ("first", "raise"):
+            marketCaps = marketCaps.drop_duplicates("Company(Company)", keep="first")
+        elif self.marketCapDuplicates == "last":
+            marketCaps = marketCaps.drop_duplicates("Company(Company)", keep="last")
+        elif self.marketCapDuplicates == "mean":
+            marketCaps = marketCaps.assign(**{"MarketCap(B)": pd.to_numeric(marketCaps.loc[:, "MarketCap(B)"])})
+            marketCaps = marketCaps.groupby("Company(Company)", sort=False).mean().reset_index()
+        else:
+            raise AnalystException(f"Unknown policy for duplicate market caps: {self.marketCapDuplicates}")
+        return marketCaps.set_index("Company(Company)").loc[:, "MarketCap(B)"]
 
     def analyze_data(self, completeData):
-        analyzedData = {}
-        for year in completeData:
-            df = completeData[year]
+        return self.run_years("analyze_year", {year: (completeData[year],) for year in completeData})
+
+    def analyze_year(self, year, df):
+        with stage(self.instrument, "analyze_data", year) as counts:
             fuels = self.get_fuels(df) # get fuels by year
             # modify the fuel names
             reserves = {k: k+v for k, v in fuels.items()}
@@ -149,7 +383,7 @@ class Analyst:
                 # populate dataframe with intensities
                 # fuels[key] is the units of the name of the fuel, market cap is in B
                 try:
-                    df[key + 'Intensity' + fuels[key] + '/$B'] = df[reserves[key]] / df['MarketCap(B)']
+                    df[key + 'Intensity' + fuels[key] + '/$B'] = self.intensity(df, key, fuels[key])
                     df[key + '(tCO2)'] = df[key + 'Intensity' + fuels[key] + '/$B'] * df['EndingMarketValue']
                 except KeyError:
                     continue
@@ -159,14 +393,18 @@ class Analyst:
             # save rows that have a carbon company affiliated
             df = df[df.loc[:, "Company(Company)"].notnull()]
             # address companies with multiple stock options
-            df = self.combine_multiple_stocks(df)
+            df = self.combine_multiple_stocks(df, fuels, year=year)
 
             for key in reserves:
                 df[key + 'Pctile'] = df[reserves[key]].rank(pct=True)
                 df[key + '(tCO2)Pctile'] = df[key + '(tCO2)'].rank(pct=True)
 
-            analyzedData[year] = df
-        return analyzedData
+            counts["rows"] = len(df.index)
+            return df
+
+    def intensity(self, df, fuel, unit):
+        # returns the reserves of fuel per billion dollars of market cap for each row of df
+        return df[fuel + unit] / df['MarketCap(B)']
 
     def get_fuels(self, df):
         # returns a dictionary with keys as names of fuels and values of units of fuels
@@ -180,25 +418,30 @@ class Analyst:
                 fuels[name] = unit
         return fuels
 
-    def combine_multiple_stocks(self, df):
+    def combine_multiple_stocks(self, df, fuels=None, year=None):
         # returns an analysis dataframe with multiple stock rows combined
         # into one company row to aggregate holdings across multiple
         # options in a company
-        multipleStockCompanies = set(df[df.duplicated(subset="Company(Company)")].loc[:, "Company(Company)"])
-        for duplicate in multipleStockCompanies:
-            combinedStocksCompany = pd.DataFrame()
-            allCompanyStocks = df[df.loc[:, "Company(Company)"] == duplicate]
-            keepSame = ["Company(Company)", "MarketCap(B)", "Stocks", "CoalIntensity(GtCO2)/$B",
-                        "OilIntensity(GtCO2)/$B", "GasIntensity(GtCO2)/$B"]
-            sumColumns = ["EndingMarketValue", "Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]
+        # the company's first row is kept in place, with the holdings and
+        # carbon held columns summed across all of its stocks
+        with stage(self.instrument, "combine_multiple_stocks", year) as counts:
+            counts["rows"] = len(df.index)
+            if fuels is None:
+                fuels = self.get_fuels(df)
+            sumColumns = [col for col in ["EndingMarketValue"] + [fuel + "(tCO2)" for fuel in fuels]
+                          if col in df.columns]
 
-            for col in keepSame:
-                combinedStocksCompany.loc[0,col] = allCompanyStocks.loc[:, col].values[0]
+            companies = df.loc[:, "Company(Company)"]
+            multipleStocks = companies.duplicated(keep=False) & companies.notnull()
+            if not multipleStocks.any():
+                return df
+            sums = df[multipleStocks].groupby("Company(Company)")[sumColumns].sum()
 
+            firstStocks = multipleStocks & ~companies.duplicated()
+            df = df[~multipleStocks | firstStocks].copy()
+            firstStocks = firstStocks[df.index]
             for col in sumColumns:
-                combinedStocksCompany.loc[0,col] = allCompanyStocks.loc[:, col].sum()
-
-            df.drop(allCompanyStocks.index, inplace=True)
-            df = df.append(combinedStocksCompany, ignore_index=True)
+                df.loc[firstStocks, col] = df.loc[firstStocks, "Company(Company)"].map(sums.loc[:, col])
 
-        return df
+            counts["combinedRows"] = int(multipleStocks.sum() - firstStocks.sum())
+            return df.reset_index(drop=True)
@@ -1,32 +1,63 @@
+import os
+
 import numpy as np
 import pandas as pd
-import os
-from ffequity.utils.dataframefile import DataFrameFile
-from datetime import datetime
-from IPython.display import display, HTML
-import matplotlib.pyplot as plt
-import mpld3
-from mpld3 import plugins
-from mpld3.utils import get_id
-import collections
-import matplotlib
+from ffequity.processors.panel import Panel
+from ffequity.processors.schema import is_fuel_column
 from ffequity.utils.dataframefile import DataFrameFile
 
+
+def display(df):
+    # IPython is only imported once something is shown, and outside of a notebook the table is printed
+    try:
+        from IPython.display import display as ipythonDisplay
+    except ImportError:
+        print(df.to_string())
+        return None
+    return ipythonDisplay(df)
+
+
+def pyplot():
+    # matplotlib is imported on the first plot rather than with this module, so runs that only
+    # aggregate tables start faster and don't need matplotlib, mpld3 or IPython installed
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def thousands_formatter():
+    # formats axis ticks as whole numbers with thousands separators
+    from matplotlib.ticker import FuncFormatter
+    return FuncFormatter(lambda x, p: format(int(x), ','))
+
+
+sortMap = {
+    "EMV" : "EndingMarketValue",
+    "COAL" : "Coal(tCO2)",
+    "OIL" : "Oil(tCO2)",
+    "GAS" : "Gas(tCO2)"
+}
+
+
 class BenchmarkException(Exception):
     pass
 
-class Benchmark:
-    '''
-    Benchmark will host the back end code for data visualization in the
-    front-end Ipython Notebook to make the user experience cleaner
-    '''
+class BenchmarkTables:
+    """The tables behind Benchmark, read and aggregated without any plotting or display dependencies"""
 
-    def __init__(self, years, data={}, aggregateTable=None):
+    def __init__(self, years, data={}, aggregateTable=None, cacheDir=None, store=None, portfolio="",
+                 totalEquity=None):
         self.years = years # user will pass in years
         self.data = data
         self.aggregateTable = aggregateTable
-
-    def show_sample_tables(self, switch=None):
+        self.cacheDir = cacheDir  # folder of parsed csv files kept between runs, None to always parse
+        # SQLite file the tables are read from instead of the csv files, None to read the csv files
+        self.store = store
+        self.portfolio = portfolio  # whose tables are read from the store
+        # {year: total equity}, such as the totals Validator counted while streaming the equity
+        # files (dfs.year_totals()); None to total the files in ./data/equity_data
+        self.totalEquity = totalEquity
+
+    def sample_table(self, switch=None):
         if switch == "Carbon":
             columns = ["Company(Company)", "Coal(GtCO2)", "Oil(GtCO2)", "Gas(GtCO2)"]
             data = {
@@ -55,13 +86,16 @@ class Benchmark:
 
         else:
             print("Please select a sample table to view.")
-        return display(df)
+            df = None
+        return df
 
     # pull the data frames that were written out by Analyst
 
     # modify get_tables to be get_equity_tables from /assessment
     def get_equity_tables(self):
-        dataframefile = DataFrameFile()
+        if self.store is not None:
+            return self.get_store_tables("assessment")
+        dataframefile = DataFrameFile(cacheDir=self.cacheDir)
         data = {}
         with os.scandir(path="./data/assessment") as it:
             currentFiles = [x.name for x in it]  # store name attributes of all files in a folder
@@ -77,7 +111,9 @@ class Benchmark:
         return self.data
 
     def get_tables(self):
-        dataframefile = DataFrameFile()
+        if self.store is not None:
+            return self.get_store_tables("benchmarks")
+        dataframefile = DataFrameFile(cacheDir=self.cacheDir)
         data = {}
         with os.scandir(path="./data/benchmarks") as it:
             currentFiles = [x.name for x in it]  # store name attributes of all files in a folder
@@ -91,6 +127,24 @@ class Benchmark:
         self.data = data
         return self.data
 
+    def get_store_tables(self, table):
+        # reads every year of the portfolio's table from the store in one query
+        df = self.query(table, years=self.years, portfolios=[self.portfolio])
+        data = Panel(df.drop(columns="Portfolio")).to_years()
+        assert len(data.keys()) == len(self.years)
+        self.data = data
+        return self.data
+
+    def query(self, table="benchmarks", **filters):
+        # returns the rows of table in the store matching filters, see DataFrameFile.query, so that only
+        # the rows asked for are read; i.e. every year a company held more than 1e9 tCO2 of coal:
+        # query(companies=["Peabody Energy"], where='"Coal(tCO2)" > ?', params=(1e9,), columns=["Year"])
+        return DataFrameFile(store=self.store).query(table, **filters)
+
+    def top_holdings(self, column="EndingMarketValue", rows=5, table="benchmarks", **filters):
+        # returns the rows holdings with the most of column across every year and portfolio in the store
+        return self.query(table, orderBy=column, ascending=False, limit=rows, **filters)
+
     def company_names(self):
         for year in self.years:
             matchedCompanies = self.data[year].loc[:, "Company(Company)"].notnull()
@@ -102,209 +156,183 @@ class Benchmark:
             print(f"{companySentence}\n")
 
     def get_total_equity(self):
+        if self.totalEquity is not None:
+            return self.totalEquity
         # read in the equity dataframes
-        dataframefile = DataFrameFile()
-        data = {}
+        # only the market value column of each equity file is read, or its cached frame
+        dataframefile = DataFrameFile(cacheDir=self.cacheDir)
+        totalEquity = {}
         with os.scandir(path="./data/equity_data") as it:
             currentFiles = [x.name for x in it if x.name != ".gitignore"]  # store name attributes of all files in a folder
             for fileName in currentFiles:
-                df = dataframefile.read(os.path.join("./data/equity_data/", fileName))
-                data[fileName[0:4]] = df
-        assert len(data.keys()) == len(self.years)
-        totalEquity = {}
-        for year in data:
-            totalEquity[year] = float(data[year]["EndingMarketValue"].sum())
+                totalEquity[fileName[0:4]] = dataframefile.total(os.path.join("./data/equity_data/", fileName))
+        assert len(totalEquity.keys()) == len(self.years)
         return totalEquity
 
     def aggregate_equity_table(self):
-        # make Total Individual Equity column
-        totalEquity = self.get_total_equity()
-        totalEquity = pd.DataFrame.from_dict(data=totalEquity, orient="index")
-        totalEquity.columns = ["Total Individual Equity"]
-
-        # make the aggregate columns with Year
-        aggregateColumns = ["Year"]
-        aggregateTable = pd.DataFrame(columns=aggregateColumns)
-        aggregateTable.loc[:, aggregateColumns] = 0
-        aggregateTable.loc[:, "Year"] = self.data.keys()
-        aggregateTable.set_index("Year", inplace=True)
-
-        # initiate table to aggregate fossil fuel equity by fuel type
-        fossilFuelEquity = pd.DataFrame()
-
-        row = 0
-        for year in self.data:
-            fossilFuelEquity.loc[row, "Year"] = year
-            fossilFuelRows = self.data[year].loc[:, "Company(Company)"].notnull()
-            fossilFuelEquity.loc[row, "Fossil Fuel Equity"] = self.data[year].loc[fossilFuelRows, "EndingMarketValue"].sum()
-            row += 1
-        fossilFuelEquity.set_index("Year", inplace=True)
-
-        # dollars by fuel type
-        coalEmv = {}
-        oilEmv = {}
-        gasEmv = {}
-
-        for year in self.data:
-            coalRows = self.data[year].loc[:, "Coal(GtCO2)"] > 0
-            oilRows = self.data[year].loc[:, "Oil(GtCO2)"] > 0
-            gasRows = self.data[year].loc[:, "Gas(GtCO2)"] > 0
-            # to allocate dollars by fuel type, divide fuel type reserve by sum of total reserves and multiply by EMV
-            totalReservesCoal = self.data[year].loc[coalRows, ["Coal(GtCO2)", "Oil(GtCO2)", "Gas(GtCO2)"]].sum(axis=1)
-            coalEmv[year] = ((self.data[year].loc[coalRows, "Coal(GtCO2)"] / totalReservesCoal)
-                              * self.data[year].loc[coalRows, "EndingMarketValue"])
-            totalReservesOil = self.data[year].loc[oilRows, ["Coal(GtCO2)", "Oil(GtCO2)", "Gas(GtCO2)"]].sum(axis=1)
-            oilEmv[year] = ((self.data[year].loc[oilRows, "Oil(GtCO2)"] / totalReservesOil)
-                              * self.data[year].loc[oilRows, "EndingMarketValue"])
-            totalReservesGas = self.data[year].loc[gasRows, ["Coal(GtCO2)", "Oil(GtCO2)", "Gas(GtCO2)"]].sum(axis=1)
-            gasEmv[year] = ((self.data[year].loc[gasRows, "Gas(GtCO2)"] / totalReservesGas)
-                              * self.data[year].loc[gasRows, "EndingMarketValue"])
-
-        coalEquity = pd.DataFrame()
-        oilEquity = pd.DataFrame()
-        gasEquity = pd.DataFrame()
-
-        row = 0
-        for year in self.data:
-            coalEquity.loc[row, "Year"] = year
-            coalEquity.loc[row, "Coal Equity"] = coalEmv[year].sum()
-
-            oilEquity.loc[row, "Year"] = year
-            oilEquity.loc[row, "Oil Equity"] = oilEmv[year].sum()
-
-            gasEquity.loc[row, "Year"] = year
-            gasEquity.loc[row, "Gas Equity"] = gasEmv[year].sum()
-
-            row += 1
-
-        coalEquity.set_index("Year", inplace=True)
-        oilEquity.set_index("Year", inplace=True)
-        gasEquity.set_index("Year", inplace=True)
-
-        aggregateTable = pd.concat([aggregateTable, fossilFuelEquity, totalEquity, coalEquity, oilEquity, gasEquity]
-                                    , axis=1)
+        # summarize the assessment tables, where only matched stocks are fossil fuel equity
+        aggregateTable = self.summarize("(GtCO2)", matchedOnly=True, reserves=False)
         self.aggregateTable = aggregateTable
         return aggregateTable
 
     def aggregate_table(self):
-        # make Total Individual Equity column
-        totalEquity = self.get_total_equity()
-        totalEquity = pd.DataFrame.from_dict(data=totalEquity, orient="index")
-        totalEquity.columns = ["Total Individual Equity"]
-
-        # make the aggregate columns with Year
-        aggregateColumns = ["Year"]
-        aggregateTable = pd.DataFrame(columns=aggregateColumns)
-        aggregateTable.loc[:, aggregateColumns] = 0
-        aggregateTable.loc[:, "Year"] = self.data.keys()
-        aggregateTable.set_index("Year", inplace=True)
-
-        # initiate table to aggregate fossil fuel equity by fuel type
-        fossilFuelEquity = pd.DataFrame()
-
-        row = 0
-        for year in self.data:
-            fossilFuelEquity.loc[row, "Year"] = year
-            fossilFuelEquity.loc[row, "Fossil Fuel Equity"] = self.data[year].loc[:, "EndingMarketValue"].sum()
-            row += 1
-        fossilFuelEquity.set_index("Year", inplace=True)
-
-        # dollars by fuel type
-        coalEmv = {}
-        oilEmv = {}
-        gasEmv = {}
-
-        for year in self.data:
-            coalRows = self.data[year].loc[:, "Coal(tCO2)"] > 0
-            oilRows = self.data[year].loc[:, "Oil(tCO2)"] > 0
-            gasRows = self.data[year].loc[:, "Gas(tCO2)"] > 0
-            # to allocate dollars by fuel type, divide fuel type reserve by sum of total reserves and multiply by EMV
-            totalReservesCoal = self.data[year].loc[coalRows, ["Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]].sum(axis=1)
-            coalEmv[year] = ((self.data[year].loc[coalRows, "Coal(tCO2)"] / totalReservesCoal)
-                              * self.data[year].loc[coalRows, "EndingMarketValue"])
-            totalReservesOil = self.data[year].loc[oilRows, ["Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]].sum(axis=1)
-            oilEmv[year] = ((self.data[year].loc[oilRows, "Oil(tCO2)"] / totalReservesOil)
-                              * self.data[year].loc[oilRows, "EndingMarketValue"])
-            totalReservesGas = self.data[year].loc[gasRows, ["Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]].sum(axis=1)
-            gasEmv[year] = ((self.data[year].loc[gasRows, "Gas(tCO2)"] / totalReservesGas)
-                              * self.data[year].loc[gasRows, "EndingMarketValue"])
-
-        coalEquity = pd.DataFrame()
-        oilEquity = pd.DataFrame()
-        gasEquity = pd.DataFrame()
-
-        row = 0
-        for year in self.data:
-            coalEquity.loc[row, "Year"] = year
-            coalEquity.loc[row, "Coal Equity"] = coalEmv[year].sum()
-
-            oilEquity.loc[row, "Year"] = year
-            oilEquity.loc[row, "Oil Equity"] = oilEmv[year].sum()
-
-            gasEquity.loc[row, "Year"] = year
-            gasEquity.loc[row, "Gas Equity"] = gasEmv[year].sum()
-
-            row += 1
-
-        coalEquity.set_index("Year", inplace=True)
-        oilEquity.set_index("Year", inplace=True)
-        gasEquity.set_index("Year", inplace=True)
-
-        # total carbon reserves
-        coalReserves = pd.DataFrame()
-        oilReserves = pd.DataFrame()
-        gasReserves = pd.DataFrame()
-        totalReserves = pd.DataFrame()
-
-        row = 0
-        for year in self.data:
-            coalReserves.loc[row, "Year"] = year
-            coalReserves.loc[row, "Coal Reserves (tCO2)"] = self.data[year].loc[:, "Coal(tCO2)"].sum()
-
-            oilReserves.loc[row, "Year"] = year
-            oilReserves.loc[row, "Oil Reserves (tCO2)"] = self.data[year].loc[:, "Oil(tCO2)"].sum()
-
-            gasReserves.loc[row, "Year"] = year
-            gasReserves.loc[row, "Gas Reserves (tCO2)"] = self.data[year].loc[:, "Gas(tCO2)"].sum()
-
-            totalReserves.loc[row, "Year"] = year
-            totalReserves.loc[row, "Total Reserves (tCO2)"] = self.data[year].loc[:, ["Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]].sum().sum()
-
-            row += 1
-
-        coalReserves.set_index("Year", inplace=True)
-        oilReserves.set_index("Year", inplace=True)
-        gasReserves.set_index("Year", inplace=True)
-        totalReserves.set_index("Year", inplace=True)
-
-        # carbon reserves by fuel type
-
-        aggregateTable = pd.concat([aggregateTable, fossilFuelEquity, totalEquity, coalEquity, oilEquity, gasEquity,
-                                    coalReserves, oilReserves, gasReserves, totalReserves]
-                                    , axis=1)
+        # summarize the benchmark tables, including the carbon reserves invested in
+        aggregateTable = self.summarize("(tCO2)", matchedOnly=False, reserves=True)
         self.aggregateTable = aggregateTable
         return aggregateTable
 
-    def show_top(self, rows=5, sort="EMV"):
-        sortMap = {
-            "EMV" : "EndingMarketValue",
-            "COAL" : "Coal(tCO2)",
-            "OIL" : "Oil(tCO2)",
-            "GAS" : "Gas(tCO2)"
+    def fuel_columns(self, unit):
+        # returns {fuel: column} for the fuel columns measured in unit, i.e. {"Coal": "Coal(tCO2)"}
+        fuels = {}
+        for df in self.data.values():
+            for col in df.columns:
+                if col.endswith(unit) and is_fuel_column(col):
+                    fuels.setdefault(col[:-len(unit)], col)
+        return fuels
+
+    def panel(self, columns=None):
+        # returns every year's table, or only the given columns of it, as one Panel with
+        # Year and Holding (the row within that year's table) columns
+        frames = self.data
+        if columns is not None:
+            frames = {year: df.reindex(columns=columns) for year, df in self.data.items()}
+        return Panel.from_years(frames, rowName="Holding")
+
+    def stack_years(self, columns):
+        return self.panel(columns).df
+
+    def company_trend(self, column="EndingMarketValue"):
+        # returns the total of column held in each company with a column per year, in one pivot over every year
+        return self.panel(["Company(Company)", column]).trend(column)
+
+    def long_table(self, unit):
+        # returns every year's holdings in long format, one row per year, holding and fuel,
+        # with the reserves of that fuel and the equity allocated to it
+        fuels = self.fuel_columns(unit)
+        columns = ["Stocks", "Company(Company)", "EndingMarketValue"] + list(fuels.values())
+        long = self.stack_years(columns).melt(id_vars=["Year", "Holding"] + columns[:3],
+                                              value_vars=list(fuels.values()), var_name="Fuel", value_name="Reserves")
+        long["Fuel"] = long["Fuel"].map({col: fuel for fuel, col in fuels.items()})
+        # to allocate dollars by fuel type, divide fuel type reserve by sum of total reserves and multiply by EMV
+        totalReserves = long.groupby(["Year", "Holding"])["Reserves"].transform("sum")
+        long["Equity"] = (long["Reserves"] / totalReserves * long["EndingMarketValue"]).where(long["Reserves"] > 0)
+        return long
+
+    def summarize(self, unit, matchedOnly, reserves):
+        # returns the equity, and optionally the reserves, by year and fuel as one row per year
+        years = list(self.data)
+        fuels = list(self.fuel_columns(unit))
+        holdings = self.stack_years(["Company(Company)", "EndingMarketValue"])
+        if matchedOnly:
+            holdings = holdings.loc[holdings.loc[:, "Company(Company)"].notnull()]
+        long = self.long_table(unit)
+        byFuel = long.groupby(["Year", "Fuel"])[["Equity", "Reserves"]].sum().unstack("Fuel")
+
+        columns = {
+            "Fossil Fuel Equity": holdings.groupby("Year")["EndingMarketValue"].sum(),
+            "Total Individual Equity": pd.Series(self.get_total_equity()),
         }
+        for fuel in fuels:
+            columns[f"{fuel} Equity"] = byFuel.loc[:, ("Equity", fuel)]
+        if reserves:
+            for fuel in fuels:
+                columns[f"{fuel} Reserves {unit}"] = byFuel.loc[:, ("Reserves", fuel)]
+            columns[f"Total Reserves {unit}"] = byFuel.loc[:, "Reserves"].sum(axis=1)
+        aggregateTable = pd.DataFrame(columns, columns=list(columns)).reindex(years).astype(float)
+        aggregateTable.index.name = "Year"
+        return aggregateTable
+
+    def top(self, year, rows=5, sort="EMV"):
+        # returns the rows companies of year with the most of sort
         columns = ["Company(Company)", "Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)", "EndingMarketValue"]
+        return self.data[year].loc[:, columns].sort_values(by=sortMap[sort], ascending=False).iloc[0:rows, :]
+
+    def scatter_points(self, year, maxPoints=1000, topN=20):
+        # returns the points of year's scatterplot with EndingMarketValue, Reserves, Company(Company)
+        # and Count, one per holding when there are at most maxPoints of them (or maxPoints is None);
+        # otherwise the topN holdings by equity and by reserves and the outliers are kept as they
+        # are and the rest binned into points standing for Count holdings, so at most maxPoints are drawn
+        df = self.data[year]
+        points = pd.DataFrame({
+            "EndingMarketValue": df.loc[:, "EndingMarketValue"].astype(float),
+            "Reserves": df.loc[:, ["Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]].sum(axis=1),
+            "Company(Company)": df.loc[:, "Company(Company)"],
+            "Count": 1,
+        }, columns=["EndingMarketValue", "Reserves", "Company(Company)", "Count"]).reset_index(drop=True)
+        if maxPoints is None or len(points.index) <= maxPoints:
+            return points
+        if maxPoints < 1:
+            raise BenchmarkException(f"maxPoints must be positive: {maxPoints}")
+        # the top holdings by each column leave at least one point for binning the rest
+        topN = min(topN, (maxPoints - 1) // 2)
+
+        top = np.zeros(len(points.index), dtype=bool)
+        outliers = np.zeros(len(points.index), dtype=bool)
+        for col in ["EndingMarketValue", "Reserves"]:
+            top |= (points.loc[:, col].rank(method="first", ascending=False) <= topN).values
+            # outliers are measured on a log scale, as equity and reserves both span orders of magnitude
+            logs = np.log10(points.loc[:, col].clip(lower=0) + 1)
+            q1, q3 = logs.quantile([0.25, 0.75])
+            outliers |= ((logs < q1 - 1.5 * (q3 - q1)) | (logs > q3 + 1.5 * (q3 - q1))).values
+        keep = top | outliers
+        if keep.sum() > maxPoints:
+            keep = top  # too many outliers to draw singly, so they are binned with the rest
+        exact = points.loc[keep]
+        binned = self.bin_points(points.loc[~keep], maxPoints - len(exact.index))
+        return pd.concat([exact, binned], ignore_index=True)
+
+    @staticmethod
+    def bin_points(points, budget):
+        # returns points merged by cell of a log-scaled grid coarse enough that at most budget cells
+        # are occupied, each cell becoming one point at the mean of its holdings
+        if points.empty or budget < 1:
+            return points.iloc[0:0]
+        logs = np.log10(points.loc[:, ["EndingMarketValue", "Reserves"]].clip(lower=0).values + 1)
+        low = logs.min(axis=0)
+        span = logs.max(axis=0) - low
+        span[span == 0] = 1
+        bins = budget
+        while True:
+            cells = np.minimum((logs - low) / span * bins, bins - 1).astype(int)
+            cellIds = cells[:, 0] * bins + cells[:, 1]
+            if len(np.unique(cellIds)) <= budget or bins == 1:
+                break
+            bins = max(int(bins * 0.75), 1)
+
+        grouped = points.groupby(cellIds, sort=False)
+        binned = grouped[["EndingMarketValue", "Reserves"]].mean()
+        binned["Count"] = grouped.size()
+        # a cell holding one company keeps its name, the others are labeled with their count
+        labels = binned["Count"].astype(str) + " holdings"
+        binned["Company(Company)"] = grouped["Company(Company)"].first().where(binned["Count"] == 1, labels)
+        return binned.loc[:, points.columns].reset_index(drop=True)
+
+
+class Benchmark(BenchmarkTables):
+    '''
+    Benchmark will host the back end code for data visualization in the
+    front-end Ipython Notebook to make the user experience cleaner
+    '''
+
+    def show_sample_tables(self, switch=None):
+        df = self.sample_table(switch)
+        if df is None:
+            return None
+        return display(df)
+
+    def show_top(self, rows=5, sort="EMV"):
         for year in self.years:
+            top5 = self.top(year, rows=rows, sort=sort)
             print(f"Top {rows} sorted by {sortMap[sort]} for {year}")
-            top5 = self.data[year].loc[:, columns].sort_values(by=sortMap[sort], ascending=False).iloc[0:rows, :]
             display(top5)
 
-    def plot_fossil_fuel_equity(self):
+    # the draw_* methods draw a chart onto the axes given, so the same chart can be shown
+    # in the notebook by the plot_* methods or written to a file by the report export
 
+    def draw_fossil_fuel_equity(self, ax):
         N = len(self.aggregateTable.index)
         x = self.aggregateTable.loc[:, "Fossil Fuel Equity"]
 
-        fig, ax = plt.subplots()
-
         index = np.arange(N)
         width = 0.35
 
@@ -314,19 +342,15 @@ class Benchmark:
         ax.set_title("Dollars invested in fossil fuel companies by year")
         ax.set_xticks(index)
         ax.set_xticklabels(self.aggregateTable.index.values.tolist())
-        ax.get_yaxis().set_major_formatter(
-            matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
+        ax.get_yaxis().set_major_formatter(thousands_formatter())
+        return chart
 
-        return plt.show()
-
-    def plot_fossil_fuel_equity_fuel_types(self):
+    def draw_fossil_fuel_equity_fuel_types(self, ax):
         N = len(self.aggregateTable.index)
         coal = self.aggregateTable.loc[:, "Coal Equity"]
         oil = self.aggregateTable.loc[:, "Oil Equity"]
         gas = self.aggregateTable.loc[:, "Gas Equity"]
 
-        fig, ax = plt.subplots()
-
         index = np.arange(N)
         width = 0.35
 
@@ -339,16 +363,14 @@ class Benchmark:
         ax.set_title("Dollars invested in fossil fuel companies by year by fuel type")
         ax.set_xticks(index)
         ax.set_xticklabels(self.aggregateTable.index.values.tolist())
-        ax.get_yaxis().set_major_formatter(
-            matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
+        ax.get_yaxis().set_major_formatter(thousands_formatter())
 
         ax.legend(handles=(x1, x2, x3), labels=("Coal", "Oil", "Gas"), loc="right", bbox_to_anchor=(1.15 ,0.5))
-        return plt.show();
+        return x1, x2, x3
 
-    def plot_reserves(self):
+    def draw_reserves(self, ax):
         N = len(self.aggregateTable.index)
         x = self.aggregateTable.loc[:, "Total Reserves (tCO2)"]
-        fig, ax = plt.subplots()
 
         index = np.arange(N)
         width = 0.35
@@ -359,19 +381,15 @@ class Benchmark:
         ax.set_title("Carbon reserves invested in")
         ax.set_xticks(index)
         ax.set_xticklabels(self.aggregateTable.index.values.tolist())
-        ax.get_yaxis().set_major_formatter(
-            matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ",")))
-
-        return plt.show()
+        ax.get_yaxis().set_major_formatter(thousands_formatter())
+        return chart
 
-    def plot_reserves_fuel_type(self):
+    def draw_reserves_fuel_type(self, ax):
         N = len(self.aggregateTable.index)
         coal = self.aggregateTable.loc[:, "Coal Reserves (tCO2)"]
         oil = self.aggregateTable.loc[:, "Oil Reserves (tCO2)"]
         gas = self.aggregateTable.loc[:, "Gas Reserves (tCO2)"]
 
-        fig, ax = plt.subplots()
-
         index = np.arange(N)
         width = 0.35
 
@@ -384,32 +402,60 @@ class Benchmark:
         ax.set_title("Carbon reserves invested in by year by fuel type")
         ax.set_xticks(index)
         ax.set_xticklabels(self.aggregateTable.index.values.tolist())
-        ax.get_yaxis().set_major_formatter(
-            matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
+        ax.get_yaxis().set_major_formatter(thousands_formatter())
 
         ax.legend(handles=(x1, x2, x3), labels=("Coal", "Oil", "Gas"), loc="right", bbox_to_anchor=(1.15 ,0.5))
-        return plt.show();
+        return x1, x2, x3
 
-    def scatterplot(self, year):
+    def draw_scatterplot(self, ax, year, points=None):
         assert year in self.years
-        df = self.data[year]
-        reserve = df.loc[:, ["Coal(tCO2)", "Oil(tCO2)", "Gas(tCO2)"]].sum(axis=1)
-        emv = df.loc[:, ["EndingMarketValue"]]
+        if points is None:
+            points = self.scatter_points(year)
+        # binned points are drawn larger, their area growing with the holdings they stand for
+        sizes = 36 * np.sqrt(points.loc[:, "Count"].values)
 
-        N = len(df.index)
-        fig, ax = plt.subplots()
-
-        sp = ax.scatter(emv, reserve)
+        sp = ax.scatter(points.loc[:, "EndingMarketValue"].values, points.loc[:, "Reserves"].values, s=sizes)
 
         ax.set_xlabel("Equity Invested (USD)")
         ax.set_ylabel("Carbon Reserves (tCO2)")
         ax.set_title(f"Invested Fossil Fuel Companies in {year}")
-        ax.get_xaxis().set_major_formatter(
-            matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
-        ax.get_yaxis().set_major_formatter(
-            matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',')))
+        ax.get_xaxis().set_major_formatter(thousands_formatter())
+        ax.get_yaxis().set_major_formatter(thousands_formatter())
+        return sp
+
+    def plot_fossil_fuel_equity(self):
+        plt = pyplot()
+        fig, ax = plt.subplots()
+        self.draw_fossil_fuel_equity(ax)
+        return plt.show()
+
+    def plot_fossil_fuel_equity_fuel_types(self):
+        plt = pyplot()
+        fig, ax = plt.subplots()
+        self.draw_fossil_fuel_equity_fuel_types(ax)
+        return plt.show();
+
+    def plot_reserves(self):
+        plt = pyplot()
+        fig, ax = plt.subplots()
+        self.draw_reserves(ax)
+        return plt.show()
+
+    def plot_reserves_fuel_type(self):
+        plt = pyplot()
+        fig, ax = plt.subplots()
+        self.draw_reserves_fuel_type(ax)
+        return plt.show();
+
+    def scatterplot(self, year, maxPoints=1000, topN=20):
+        # draws at most maxPoints points, see scatter_points, so large portfolios stay quick to show
+        import mpld3
+        plt = pyplot()
+        fig, ax = plt.subplots()
+        points = self.scatter_points(year, maxPoints=maxPoints, topN=topN)
+        sp = self.draw_scatterplot(ax, year, points=points)
 
-        labels = df.loc[:, "Company(Company)"].values.tolist()
+        labels = points.loc[:, "Company(Company)"].values.tolist()
         tooltip = mpld3.plugins.PointLabelTooltip(sp, labels=labels)
         mpld3.plugins.connect(fig, tooltip)
 
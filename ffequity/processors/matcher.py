@@ -0,0 +1,205 @@
+import math
+import re
+from collections import defaultdict
+from multiprocessing import Pool
+
+import fuzzywuzzy
+from fuzzywuzzy import fuzz, utils
+
+
+class MatcherException(Exception):
+    pass
+
+
+# cached scores are only reused by the same scorer implementation
+SCORER_VERSION = f"partial_token_set_ratio/fuzzywuzzy-{fuzzywuzzy.__version__}/{fuzz.SequenceMatcher.__module__}"
+
+# legal form and share class words that don't identify a company
+NAME_SUFFIXES = ["inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc", "llc",
+                 "lp", "sa", "ag", "nv", "class", "stock", "stocks", "share", "shares", "option", "options",
+                 "ord", "adr", "the"]
+ABBREVIATION_MARKS = re.compile(r"[.']")
+NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+SUFFIX_WORDS = re.compile(r"\b(?:" + "|".join(NAME_SUFFIXES) + r")\b")
+# a lone trailing letter is a share class, as in "ROYAL DUTCH SHELL A"
+SHARE_CLASS_LETTER = re.compile(r"(?<=\S)\s+[a-z]\s*$")
+
+
+def normalize_name(name):
+    # returns the name as lower case words without punctuation, legal forms or share
+    # classes so "CONSOL Energy Inc." and "CONSOL ENERGY CLASS A" share the key "consol energy"
+    key = ABBREVIATION_MARKS.sub("", str(name).lower())
+    key = NON_ALPHANUMERIC.sub(" ", key)
+    key = SUFFIX_WORDS.sub(" ", key)
+    key = SHARE_CLASS_LETTER.sub(" ", key)
+    return " ".join(key.split())
+
+
+def normalize_names(names):
+    # returns the normalized key of each name in a Series, normalizing each distinct name once
+    keys = {name: normalize_name(name) for name in names.dropna().unique()}
+    return names.map(keys).fillna("")
+
+
+# the Matcher each pool worker builds once from the equity names it is initialized with
+_workerMatcher = None
+
+
+class _CacheSnapshot(dict):
+    # copy of the cached scores handed to a pool worker that collects the scores it adds
+    def __init__(self, scores):
+        super().__init__(scores)
+        self.added = []
+
+    def put(self, key, score):
+        self[key] = score
+        self.added.append((key, score))
+
+
+def _init_worker(equityNames, thresh, gramSize, cachedScores):
+    global _workerMatcher
+    cache = _CacheSnapshot(cachedScores) if cachedScores is not None else None
+    _workerMatcher = Matcher(equityNames, thresh=thresh, gramSize=gramSize, cache=cache)
+
+
+def _match_chunk(carbonNames):
+    # returns the matches for a shard of carbon companies, the comparisons it took
+    # and the newly scored pairs for the main process to cache
+    comparisons = _workerMatcher.comparisons
+    matches = [_workerMatcher.match(carbonName) for carbonName in carbonNames]
+    added = []
+    if _workerMatcher.cache is not None:
+        added, _workerMatcher.cache.added = _workerMatcher.cache.added, []
+    return matches, _workerMatcher.comparisons - comparisons, added
+
+
+class Matcher:
+    """Matcher scores each carbon company only against the stocks that could reach the threshold"""
+    def __init__(self, equityNames, thresh=90, gramSize=3, cache=None):
+        self.thresh = thresh
+        self.gramSize = gramSize
+        self.cache = cache  # scores of previously seen name pairs, anything with get() and put()
+        self.comparisons = 0  # number of fuzzy scorer calls made so far
+        self.equityNames = list(equityNames)
+        self.equityKeys = [self.process(name) for name in self.equityNames]
+        # inverted indices from a token or a character n-gram to the stock positions containing it
+        self.tokenIndex = defaultdict(set)
+        self.gramIndex = defaultdict(set)
+        self.lengths = defaultdict(set)
+        for position, (tokens, joined) in enumerate(self.equityKeys):
+            if not joined:
+                continue  # fuzz scores an empty name 0, so it can never match
+            for token in tokens:
+                self.tokenIndex[token].add(position)
+            for gram in self.grams(joined):
+                self.gramIndex[gram].add(position)
+            self.lengths[len(joined)].add(position)
+        self.shortLengths = set()
+        self.maxLength = 0
+        self.update_short_lengths(max(self.lengths, default=0))
+
+    @staticmethod
+    def process(name):
+        # mirror the processing fuzz.partial_token_set_ratio applies to each name and
+        # return its token set along with the sorted tokens it compares when none are shared
+        if name is None:
+            return frozenset(), ""
+        tokens = frozenset(utils.full_process(name, force_ascii=True).split())
+        return tokens, " ".join(sorted(tokens))
+
+    def grams(self, joined):
+        return {joined[i:i + self.gramSize] for i in range(len(joined) - self.gramSize + 1)}
+
+    def min_common_block(self, length):
+        # the shortest common substring two names must share for partial_ratio to reach thresh,
+        # where length is the shorter name and the window of the longer one may be cut short
+        ratio = (self.thresh - 0.5) / 100 - 1e-9
+        best = length
+        for window in range(1, length + 1):
+            matched = max(math.ceil(ratio * (length + window) / 2), 0)
+            if matched > min(length, window):
+                continue
+            # every gap between matching blocks costs at least one unmatched character
+            blocks = (length - matched) + (window - matched) + 1
+            best = min(best, math.ceil(matched / blocks))
+        return best
+
+    def update_short_lengths(self, length):
+        # names at or below a length whose guaranteed common block is shorter than a gram
+        # cannot be pruned by the gram index, so they are scored against everything
+        for size in range(self.maxLength + 1, length + 1):
+            if self.min_common_block(size) < self.gramSize:
+                self.shortLengths.add(size)
+        self.maxLength = max(self.maxLength, length)
+
+    def candidates(self, carbonName):
+        # returns the sorted stock positions sharing a token and those that still need scoring
+        if self.thresh <= 0:
+            return [], list(range(len(self.equityNames)))
+        tokens, joined = self.process(carbonName)
+        if not joined:
+            return [], []
+        self.update_short_lengths(len(joined))
+
+        shared = set()
+        for token in tokens:
+            shared |= self.tokenIndex.get(token, set())
+
+        if len(joined) in self.shortLengths:
+            scored = set().union(*self.lengths.values())
+        else:
+            scored = set()
+            for gram in self.grams(joined):
+                scored |= self.gramIndex.get(gram, set())
+            for length in self.shortLengths:
+                scored |= self.lengths.get(length, set())
+        return sorted(shared), sorted(scored - shared)
+
+    def match(self, carbonName):
+        # returns (stock position, score) for every stock scoring at or above thresh, in stock order
+        shared, scored = self.candidates(carbonName)
+        carbonKey = self.process(carbonName)[1]
+        # a shared token makes partial_token_set_ratio return 100 without scoring
+        matches = [(position, 100) for position in shared]
+        for position in scored:
+            matchRatio = self.score(position, carbonName, carbonKey)
+            if matchRatio >= self.thresh:
+                matches.append((position, matchRatio))
+        return sorted(matches)
+
+    def score(self, position, carbonName, carbonKey):
+        # the score only depends on the processed names, so pairs are cached under those
+        key = (SCORER_VERSION, carbonKey, self.equityKeys[position][1])
+        if self.cache is not None:
+            matchRatio = self.cache.get(key)
+            if matchRatio is not None:
+                return matchRatio
+        self.comparisons += 1
+        matchRatio = fuzz.partial_token_set_ratio(self.equityNames[position], carbonName)
+        if self.cache is not None:
+            self.cache.put(key, matchRatio)
+        return matchRatio
+
+    def match_all(self, carbonNames, workers=1, chunkSize=64):
+        # returns the matches for each carbon company in order, sharding the companies
+        # across a process pool when more than one worker is requested
+        carbonNames = list(carbonNames)
+        if workers is None or workers < 1 or chunkSize < 1:
+            raise MatcherException(f"workers and chunkSize must be positive: {workers}, {chunkSize}")
+        if workers == 1 or len(carbonNames) <= chunkSize:
+            return [self.match(carbonName) for carbonName in carbonNames]
+
+        chunks = [carbonNames[i:i + chunkSize] for i in range(0, len(carbonNames), chunkSize)]
+        allMatches = []
+        # the equity names reach each worker once through the initializer rather than with every chunk;
+        # a multiprocessing Pool takes an initializer on Python 3.6, unlike ProcessPoolExecutor
+        cachedScores = self.cache.snapshot() if self.cache is not None else None
+        with Pool(processes=workers, initializer=_init_worker,
+                  initargs=(self.equityNames, self.thresh, self.gramSize, cachedScores)) as pool:
+            # imap yields the chunks back in submission order, so the merge matches the serial path
+            for matches, comparisons, added in pool.imap(_match_chunk, chunks):
+                allMatches.extend(matches)
+                self.comparisons += comparisons
+                for key, matchRatio in added:
+                    self.cache.put(key, matchRatio)
+        return allMatches
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+
+class PanelException(Exception):
+    pass
+
+
+def keys_by_year(dfs, folder=None):
+    # returns {year: [keys]} of the frames in dfs, only those of folder if one is given; the years
+    # and folders come from the manifest of dfs built by Validator, or else from keys like '2016carbon_data'
+    manifest = getattr(dfs, "manifest", None)
+    if manifest is not None:
+        entries = [(entry["year"], entry["folder"], key) for key, entry in manifest.items()]
+    else:
+        entries = [(key[:4], key[4:], key) for key in dfs]
+    keys = {}
+    for year, keyFolder, key in sorted(entries):
+        if folder is None or keyFolder == folder:
+            keys.setdefault(year, []).append(key)
+    return keys
+
+
+class Panel:
+    """Panel holds one kind of data for every year as a single long frame with a Year column"""
+    def __init__(self, df):
+        if "Year" not in df.columns:
+            raise PanelException(f"A panel needs a Year column: {list(df.columns)}")
+        # rows are kept grouped by year, so a year is a slice of the frame rather than a filter over it
+        self.df = df.assign(Year=df.loc[:, "Year"].astype(str)).sort_values("Year", kind="mergesort")
+        self.df = self.df.reset_index(drop=True)
+        years, starts = np.unique(self.df.loc[:, "Year"].values, return_index=True)
+        stops = list(starts[1:]) + [len(self.df.index)]
+        self.bounds = {year: (start, stop) for year, start, stop in zip(years, starts, stops)}
+
+    @classmethod
+    def from_years(cls, frames, rowName="Row"):
+        # builds a panel from {year: frame}, keeping each row's position within its year as rowName
+        frames = {str(year): df for year, df in frames.items()}
+        if not frames:
+            return cls(pd.DataFrame({"Year": pd.Series(dtype=str), rowName: pd.Series(dtype=int)},
+                                    columns=["Year", rowName]))
+        return cls(pd.concat(frames, names=["Year", rowName]).reset_index())
+
+    @classmethod
+    def from_dfs(cls, dfs, folder, rowName="Row"):
+        # builds a panel from the frames of one folder of dfs, as returned by Validator.validate_data
+        return cls.from_years({year: dfs[keys[0]] for year, keys in keys_by_year(dfs, folder).items()},
+                              rowName=rowName)
+
+    def years(self):
+        return list(self.bounds)
+
+    def year(self, year):
+        # returns one year's rows as the frame that year was built from, without the Year column
+        if str(year) not in self.bounds:
+            raise PanelException(f"No data for {year}, the panel has {self.years()}")
+        start, stop = self.bounds[str(year)]
+        return self.df.iloc[start:stop].drop(columns="Year").reset_index(drop=True)
+
+    def between(self, first, last):
+        # returns a panel of the years from first to last, both included
+        years = [year for year in self.bounds if str(first) <= year <= str(last)]
+        if not years:
+            return Panel(self.df.iloc[0:0])
+        start, stop = self.bounds[years[0]][0], self.bounds[years[-1]][1]
+        return Panel(self.df.iloc[start:stop])
+
+    def to_years(self):
+        # returns {year: frame}, the layout Analyst and Benchmark pass between each other
+        return {year: self.year(year) for year in self.bounds}
+
+    def aggregate(self, columns, func="sum", by=()):
+        # returns func of columns for each year, and each value of the by columns within it, in one groupby
+        return self.df.groupby(["Year"] + list(by), sort=True)[list(columns)].agg(func)
+
+    def percentiles(self, column, by=()):
+        # returns each row's percentile rank of column within its year, as analyze_year ranks the companies
+        return self.df.groupby(["Year"] + list(by), sort=False)[column].rank(pct=True)
+
+    def trend(self, column, by="Company(Company)", func="sum"):
+        # returns func of column with a row per value of by and a column per year, ready to compare
+        # one year against the next
+        return self.df.groupby([by, "Year"], sort=True)[column].agg(func).unstack("Year")
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+# the analyst's stats dicts that matching for a batch writes to
+STATS = ("matchStats", "financeStats")
+
+
+class PortfolioBatchException(Exception):
+    pass
+
+
+class PortfolioBatch:
+    """PortfolioBatch attributes carbon to many portfolios held against the same carbon and financial data"""
+    def __init__(self, analyst):
+        self.analyst = analyst  # matches the stock names and supplies the intensities
+        self.portfolioNames = []
+        self.companies = None  # one row per matched carbon company with its reserves, market cap and intensities
+        # the holdings matrix in coordinate form: portfolio row, company column and dollars
+        # of every position in a carbon company, several positions in one cell being summed
+        self.holdings = None
+        # stock rows resolved by each matching stage and carbon companies with and without a market cap,
+        # by year, for the union of the portfolios' names; the analyst's own stats are left to its run
+        self.matchStats = {}
+        self.financeStats = {}
+
+    def analyze(self, year, portfolios, carbon, financial):
+        # returns one row per portfolio with its (tCO2), equity and percentile for each fuel,
+        # where portfolios maps each portfolio name to an equity frame with Stocks and EndingMarketValue
+        if not portfolios:
+            raise PortfolioBatchException(f"No portfolios to analyze for {year}")
+        self.portfolioNames = list(portfolios)
+        positions = pd.concat([df.loc[:, ["Stocks", "EndingMarketValue"]] for df in portfolios.values()],
+                              keys=range(len(portfolios)), names=["Portfolio", "Row"])
+        positions = positions.reset_index(level="Portfolio").reset_index(drop=True)
+        dollars = pd.to_numeric(positions.loc[:, "EndingMarketValue"]).fillna(0).values.astype(float)
+        portfolioRows = positions.loc[:, "Portfolio"].values
+
+        # match the union of the stock names once for every portfolio
+        names = pd.DataFrame({"Stocks": positions.loc[:, "Stocks"].dropna().unique()})
+        runStats = {name: getattr(self.analyst, name).pop(year, None) for name in STATS}
+        try:
+            matchedNames = self.analyst.match_equity(year, names, carbon)
+            companies = matchedNames.loc[matchedNames.loc[:, "Company(Company)"].notnull()]
+            companies = companies.drop_duplicates("Company(Company)").drop(columns="Stocks").reset_index(drop=True)
+            companies = self.analyst.match_finance(year, companies, financial)
+        finally:
+            # move the stats of matching the batch here and put back those of the analyst's own run
+            for name, stats in runStats.items():
+                analystStats = getattr(self.analyst, name)
+                batchStats = analystStats.pop(year, None)
+                if batchStats is not None:
+                    getattr(self, name)[year] = batchStats
+                if stats is not None:
+                    analystStats[year] = stats
+        companyOf = positions.loc[:, "Stocks"].map(pd.Series(matchedNames.loc[:, "Company(Company)"].values,
+                                                             index=names.loc[:, "Stocks"]))
+
+        fuels = self.analyst.get_fuels(carbon)
+        self.companies = companies
+
+        held = companyOf.notnull().values
+        companyColumns = pd.Series(range(len(companies.index)), index=companies.loc[:, "Company(Company)"])
+        self.holdings = (portfolioRows[held], companyOf[held].map(companyColumns).values, dollars[held])
+
+        # every company's intensity and share of reserves for each fuel, one column per fuel
+        reserves = companies.loc[:, [fuel + unit for fuel, unit in fuels.items()]].astype(float)
+        shares = reserves.where(reserves > 0).div(reserves.sum(axis=1), axis=0)
+        intensities = pd.DataFrame({fuel: self.analyst.intensity(companies, fuel, unit)
+                                    for fuel, unit in fuels.items()}, columns=list(fuels))
+        # market caps of 0 or missing attribute nothing, as the infinities dropped in analyze_year
+        intensities = intensities.replace([np.inf, -np.inf], np.nan)
+
+        results = pd.DataFrame(index=pd.Index(self.portfolioNames, name="Portfolio"))
+        results["EndingMarketValue"] = np.bincount(portfolioRows, weights=dollars, minlength=len(portfolios))
+        results["Fossil Fuel Equity"] = self.attribute(np.ones(len(companies.index)))
+        for position, fuel in enumerate(fuels):
+            results[fuel + "(tCO2)"] = self.attribute(intensities.iloc[:, position].values)
+            results[fuel + " Equity"] = self.attribute(shares.iloc[:, position].values)
+        for fuel in fuels:
+            results[fuel + "(tCO2)Pctile"] = results[fuel + "(tCO2)"].rank(pct=True)
+        return results
+
+    def attribute(self, vector):
+        # returns the holdings matrix times a vector with one value per company,
+        # summing the positions of each portfolio in a single pass over the holdings
+        rows, columns, dollars = self.holdings
+        weights = dollars * np.nan_to_num(np.asarray(vector, dtype=float)[columns])
+        return np.bincount(rows, weights=weights, minlength=len(self.portfolioNames))
@@ -0,0 +1,108 @@
+import html
+import io
+import os
+from multiprocessing import Pool
+
+# charts drawn from a portfolio's aggregate table, named for their files
+CHARTS = {
+    "fossil_fuel_equity": "draw_fossil_fuel_equity",
+    "fossil_fuel_equity_fuel_types": "draw_fossil_fuel_equity_fuel_types",
+    "reserves": "draw_reserves",
+    "reserves_fuel_type": "draw_reserves_fuel_type",
+}
+FORMATS = ("png", "pdf", "html")
+
+
+class ReportException(Exception):
+    pass
+
+
+def _init_worker(path, formats, dpi):
+    # the Agg backend renders to files only, so workers never need a display
+    import matplotlib
+    matplotlib.use("Agg")
+    global _workerReport
+    _workerReport = Report(path, formats=formats, dpi=dpi)
+
+
+def _render_portfolio(name, benchmark):
+    return name, _workerReport.render(name, benchmark)
+
+
+class Report:
+    """Report renders every chart of a portfolio's Benchmark to png, pdf or html files without a notebook"""
+    def __init__(self, path, formats=("png",), dpi=100):
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ReportException(f"Unknown report formats {sorted(unknown)}, choose from {FORMATS}")
+        self.path = path
+        self.formats = formats
+        self.dpi = dpi
+        self.figure = None  # one figure cleared and redrawn for every chart rather than one figure per chart
+
+    def charts(self, benchmark):
+        # yields the name and drawing function of each chart, the scatterplot once per year
+        if benchmark.aggregateTable is None:
+            raise ReportException("Run aggregate_table() before exporting a report")
+        for chart, method in CHARTS.items():
+            yield chart, getattr(benchmark, method)
+        for year in benchmark.years:
+            yield f"scatterplot_{year}", lambda ax, year=year: benchmark.draw_scatterplot(ax, year)
+
+    def render(self, name, benchmark):
+        # returns the files written for portfolio name: a png per chart, and a pdf
+        # and an html page holding all of its charts
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        # figures made without pyplot aren't kept by it, so nothing builds up across thousands of charts
+        if self.figure is None:
+            self.figure = Figure()
+            FigureCanvasAgg(self.figure)  # matplotlib before 3.1 gives a bare Figure no canvas to save with
+        os.makedirs(self.path, exist_ok=True)
+        written = []
+        pdf = PdfPages(os.path.join(self.path, f"{name}.pdf")) if "pdf" in self.formats else None
+        svgs = []
+        try:
+            for chart, draw in self.charts(benchmark):
+                self.figure.clf()
+                draw(self.figure.add_subplot(111))
+                if "png" in self.formats:
+                    fileName = os.path.join(self.path, f"{name}_{chart}.png")
+                    self.figure.savefig(fileName, dpi=self.dpi, bbox_inches="tight")
+                    written.append(fileName)
+                if pdf is not None:
+                    pdf.savefig(self.figure, bbox_inches="tight")
+                if "html" in self.formats:
+                    svg = io.StringIO()
+                    self.figure.savefig(svg, format="svg", bbox_inches="tight")
+                    svgs.append(svg.getvalue())
+        finally:
+            self.figure.clf()
+            if pdf is not None:
+                pdf.close()
+        if pdf is not None:
+            written.append(os.path.join(self.path, f"{name}.pdf"))
+        if "html" in self.formats:
+            fileName = os.path.join(self.path, f"{name}.html")
+            with open(fileName, 'w') as fd:
+                fd.write(f"<html><head><title>{html.escape(name)}</title></head><body>\n"
+                         f"<h1>{html.escape(name)}</h1>\n" + "\n".join(svgs) + "\n</body></html>\n")
+            written.append(fileName)
+        return written
+
+
+def export_reports(benchmarks, path, formats=("png",), workers=1, dpi=100):
+    # renders the report of every portfolio in benchmarks, a dict of portfolio name to Benchmark
+    # with its aggregate table, and returns {portfolio: [files written]}; with more than one
+    # worker the portfolios are shared across a process pool, each process reusing one figure;
+    # a multiprocessing Pool takes an initializer on Python 3.6, unlike ProcessPoolExecutor
+    report = Report(path, formats=formats, dpi=dpi)
+    if workers is None or workers < 1:
+        raise ReportException(f"workers must be positive: {workers}")
+    if workers == 1:
+        return {name: report.render(name, benchmark) for name, benchmark in benchmarks.items()}
+
+    with Pool(processes=workers, initializer=_init_worker, initargs=(path, formats, dpi)) as pool:
+        return dict(pool.starmap(_render_portfolio, benchmarks.items()))
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+class ScenarioException(Exception):
+    pass
+
+
+class Scenarios:
+    """Scenarios reruns the fair-share allocation of a year's holdings under many sets of market caps"""
+    def __init__(self, analyst, df, chunkSize=1000):
+        if chunkSize < 1:
+            raise ScenarioException(f"chunkSize must be positive: {chunkSize}")
+        self.analyst = analyst  # supplies the fuels and the market cap policy
+        self.chunkSize = chunkSize  # number of scenarios computed and handed out at a time
+        # df is a year of matched data as given to analyze_year; holdings in the same company
+        # are summed first since a company's (tCO2) is its intensity times all of its holdings
+        self.fuels = analyst.get_fuels(df)
+        matched = df.loc[df.loc[:, "Company(Company)"].notnull()]
+        grouped = matched.groupby("Company(Company)", sort=False)
+        self.companies = list(matched.loc[:, "Company(Company)"].drop_duplicates())
+        self.holdings = grouped["EndingMarketValue"].sum().reindex(self.companies).values.astype(float)
+        reserveColumns = [fuel + unit for fuel, unit in self.fuels.items()]
+        # fuels x companies
+        self.reserves = grouped[reserveColumns].first().reindex(self.companies).values.astype(float).T
+
+    def market_caps(self, financial):
+        # returns the market caps of the financial data in company order, a starting point for shocks
+        return self.analyst.market_caps(financial).reindex(self.companies).astype(float)
+
+    def run(self, marketCaps):
+        # yields the (tCO2) and (tCO2) percentile of every company for each fuel, one frame
+        # indexed by scenario and company per chunk of scenarios; marketCaps is a scenarios x
+        # companies array in company order or a frame with a column per company
+        if isinstance(marketCaps, pd.DataFrame):
+            scenarioIds = marketCaps.index
+            marketCaps = marketCaps.reindex(columns=self.companies).values
+        else:
+            marketCaps = np.atleast_2d(np.asarray(marketCaps, dtype=float))
+            scenarioIds = pd.RangeIndex(len(marketCaps))
+        if marketCaps.shape[1] != len(self.companies):
+            raise ScenarioException(f"Need a market cap for each of {len(self.companies)} companies, "
+                                    f"got {marketCaps.shape[1]}")
+
+        for start in range(0, len(marketCaps), self.chunkSize):
+            yield self.compute(scenarioIds[start:start + self.chunkSize],
+                               marketCaps[start:start + self.chunkSize].astype(float))
+
+    def compute(self, scenarioIds, marketCaps):
+        # reserves / MarketCap(B) * EndingMarketValue for every scenario, fuel and company at once
+        with np.errstate(divide="ignore", invalid="ignore"):
+            carbon = self.reserves[np.newaxis, :, :] / marketCaps[:, np.newaxis, :] * self.holdings
+        carbon[np.isinf(carbon)] = np.nan  # market caps of 0, as the infinities dropped in analyze_year
+
+        index = pd.MultiIndex.from_product([scenarioIds, self.companies], names=["Scenario", "Company(Company)"])
+        results = {}
+        for position, fuel in enumerate(self.fuels):
+            fuelCarbon = pd.DataFrame(carbon[:, position, :])
+            results[fuel + "(tCO2)"] = fuelCarbon.values.ravel()
+            # rank each scenario's companies against each other as analyze_year does
+            results[fuel + "(tCO2)Pctile"] = fuelCarbon.rank(axis=1, pct=True).values.ravel()
+        return pd.DataFrame(results, index=index, columns=list(results))
+
+    def write(self, fileName, marketCaps):
+        # streams every chunk of scenarios to a csv so the results never have to fit in memory
+        header = True
+        for chunk in self.run(marketCaps):
+            chunk.to_csv(fileName, mode="w" if header else "a", header=header)
+            header = False
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+
+class SchemaException(Exception):
+    pass
+
+
+# columns holding stock and company names, kept as the strings read: pandas' parser already
+# shares repeated strings, and interning them again only left more memory in use
+NAME_COLUMNS = ["Stocks", "Company(Company)"]
+# numeric columns other than the fuels
+NUMERIC_COLUMNS = ["EndingMarketValue", "MarketCap(B)"]
+
+
+def is_fuel_column(col):
+    # fuel columns look like Coal(GtCO2), the same rule Analyst.get_fuels uses
+    return '(' in col and 'Company' not in col and 'MarketCap' not in col
+
+
+class Schema:
+    """Schema declares the dtypes of the columns the tool works with and converts loaded frames to them"""
+    def __init__(self, floatType="float64"):
+        if np.dtype(floatType).kind != "f":
+            raise SchemaException(f"floatType must be a float dtype: {floatType}")
+        self.floatType = floatType  # float32 halves the numbers at the cost of precision
+
+    def dtypes(self, columns):
+        # returns {column: dtype} for the columns of a frame that the schema declares
+        dtypes = {}
+        for col in columns:
+            if col in NAME_COLUMNS:
+                dtypes[col] = "object"
+            elif col in NUMERIC_COLUMNS or is_fuel_column(col):
+                dtypes[col] = self.floatType
+        return dtypes
+
+    def apply(self, df, source=""):
+        # returns df with its numbers as floats, raising a SchemaException
+        # naming the file and rows of any cell that is neither blank nor a number
+        df = df.copy()
+        for col, dtype in self.dtypes(df.columns).items():
+            if dtype == "object":
+                continue
+            numbers = pd.to_numeric(df[col], errors="coerce")
+            malformed = numbers.isnull() & df[col].notnull()
+            if malformed.any():
+                rows = list(df.index[malformed][:5])
+                values = list(df.loc[malformed, col][:5])
+                raise SchemaException(f"{source} has malformed {col} cells at rows {rows}: {values}")
+            df[col] = numbers.astype(self.floatType)
+        return df
@@ -1,15 +1,130 @@
 import os
 import re
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+try:
+    from ..utils.instrument import stage
+except (ImportError, ValueError):  # the scripts import processors and utils as top-level packages
+    from utils.instrument import stage
 
 
 class ValidatorException(Exception):
     pass
 
 
+def _read_entry(dataframefile, entry, aggregateFolders, chunkSize, schema):
+    # returns the frame of a manifest entry, converted to the schema if there is one,
+    # and for aggregated folders the total market value
+    if entry["folder"] in aggregateFolders:
+        frame, total = dataframefile.aggregate(entry["path"], chunkSize=chunkSize)
+    else:
+        frame, total = dataframefile.load(entry["path"]), None
+    if schema is not None:
+        frame = schema.apply(frame, source=entry["name"])
+    return frame, total
+
+
+class LazyFrames(Mapping):
+    """Maps dfs keys such as '2016carbon_data' to dataframes, reading each file the first time it is used"""
+    def __init__(self, manifest, dataframefile, aggregateFolders=(), chunkSize=100000, schema=None,
+                 instrument=None):
+        self.manifest = {entry["key"]: entry for entry in manifest}
+        self.dataframefile = dataframefile
+        # files in these folders are streamed into one row per stock instead of read whole
+        self.aggregateFolders = tuple(aggregateFolders)
+        self.chunkSize = chunkSize
+        self.schema = schema  # dtypes each frame is converted to as it is read, None to keep pandas' own
+        self.instrument = instrument  # times each read, None to skip
+        self.frames = {}
+        self.totals = {}  # total EndingMarketValue of each aggregated file, counted while streaming
+
+    def __getitem__(self, key):
+        if key not in self.frames:
+            entry = self.manifest[key]  # raises KeyError for data the user doesn't have
+            with stage(self.instrument, "read", entry["year"]) as counts:
+                self.store(entry, _read_entry(self.dataframefile, entry, self.aggregateFolders, self.chunkSize,
+                                              self.schema))
+                counts.update(rows=len(self.frames[key].index), file=entry["name"], bytes=entry["size"])
+        return self.frames[key]
+
+    def __iter__(self):
+        return iter(self.manifest)
+
+    def __len__(self):
+        return len(self.manifest)
+
+    def year_totals(self, folder="equity_data"):
+        # {year: total EndingMarketValue} of the files of folder streamed so far, for Benchmark's totalEquity
+        return {self.manifest[key]["year"]: total for key, total in self.totals.items()
+                if self.manifest[key]["folder"] == folder}
+
+    def read_settings(self):
+        # the settings that change the frames read, for Analyst's run fingerprints
+        return {"aggregateEquity": "equity_data" in self.aggregateFolders, "schema": self.schema is not None,
+                "floatType": getattr(self.schema, "floatType", None)}
+
+    def loaded(self):
+        # the keys whose files have been read so far
+        return list(self.frames)
+
+    def load_all(self, workers, maxInflightBytes, executor="thread"):
+        # read every file not read yet on a pool of workers, holding back new files while
+        # the csv bytes being parsed would exceed maxInflightBytes; a file larger than the
+        # budget is parsed on its own
+        if executor not in ("thread", "process"):
+            raise ValidatorException(f"executor must be thread or process: {executor}")
+        executorClass = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+        pending = [entry for key, entry in self.manifest.items() if key not in self.frames]
+        running = {}
+        inflightBytes = 0
+        with stage(self.instrument, "read") as counts, executorClass(max_workers=workers) as pool:
+            for entry in pending:
+                while running and inflightBytes + entry["size"] > maxInflightBytes:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        inflightBytes -= self.collect(future, running.pop(future))
+                # load() leaves dataframefile.data alone, so the workers can share it
+                future = pool.submit(_read_entry, self.dataframefile, entry, self.aggregateFolders, self.chunkSize,
+                                     self.schema)
+                running[future] = entry
+                inflightBytes += entry["size"]
+            for future in list(running):
+                self.collect(future, running.pop(future))
+            counts.update(files=len(pending), bytes=sum(entry["size"] for entry in pending),
+                          rows=sum(len(self.frames[entry["key"]].index) for entry in pending))
+        return self
+
+    def collect(self, future, entry):
+        # store a file read by a worker and return its size
+        self.store(entry, future.result())
+        return entry["size"]
+
+    def store(self, entry, result):
+        frame, total = result
+        self.frames[entry["key"]] = frame
+        if total is not None:
+            self.totals[entry["key"]] = total
+
+
 class Validator:
     """This guys job is to find the data, validate it, and put it into data structures"""
-    def __init__(self, folderNames):
+    def __init__(self, folderNames, dataPath='./data', years=None, workers=1, maxInflightBytes=512 * 2**20,
+                 executor="thread", aggregateEquity=False, chunkSize=100000, schema=None, instrument=None):
         self.folderNames = folderNames
+        self.dataPath = dataPath
+        self.years = years  # only use files for these years, None for every year
+        # with more than one worker every file is read up front, that many at a time,
+        # with at most maxInflightBytes of csv being parsed at once
+        self.workers = workers
+        self.maxInflightBytes = maxInflightBytes
+        self.executor = executor  # read the files on threads or on processes
+        # stream lot-level equity files in chunks of chunkSize rows into one row per stock
+        self.aggregateEquity = aggregateEquity
+        self.chunkSize = chunkSize
+        self.schema = schema  # a Schema to convert every frame to as it is read
+        self.instrument = instrument  # times each stage of validation and each read, None to skip
+        self.manifest = None
 
     def validate(self, dataframefile):
         self.validate_folders()
@@ -17,45 +132,80 @@ class Validator:
         dfs = self.validate_data(dataframefile)
         return dfs  # to an Analyst instance
 
-    def validate_folders(self):
-        with os.scandir(path='./data') as it: # try ./data
+    def get_manifest(self):
+        # scan the data folder and each required folder once, recording
+        # the year, folder, path, size and mtime of every file
+        if self.manifest is not None:
+            return self.manifest
+        self.manifest = []
+        with os.scandir(path=self.dataPath) as it:
             # store name attribute of each os.DirEntry in iterator provided by scandir()
-            currentFolders = [x.name for x in it]
+            self.currentFolders = [x.name for x in it]
+        for folder in self.folderNames:
+            if folder not in self.currentFolders:
+                continue  # reported by validate_folders
+            with os.scandir(path=os.path.join(self.dataPath, folder)) as it:
+                for entry in it:
+                    if entry.name == ".gitignore":
+                        continue
+                    stat = entry.stat()
+                    self.manifest.append({
+                        "key": entry.name[:4] + folder,  # i.e. dfs['2016carbon_data']
+                        "year": entry.name[:4],
+                        "folder": folder,
+                        "name": entry.name,
+                        "path": os.path.join(self.dataPath, folder, entry.name),
+                        "size": stat.st_size,
+                        "mtime": stat.st_mtime_ns,
+                    })
+        self.manifest.sort(key=lambda entry: (entry["folder"], entry["name"]))
+        return self.manifest
+
+    def validate_folders(self):
+        with stage(self.instrument, "validate_folders"):
+            self.get_manifest()
             for folder in self.folderNames:
-                if folder not in currentFolders:
+                if folder not in self.currentFolders:
                     raise ValidatorException(f"Required folder not present: {folder}")
-            it.close()  # Explicitly close the iterator to free memory
-        print("Folders Validated")
+            print("Folders Validated")
 
     def validate_files(self):
-        for folder in self.folderNames:
-            with os.scandir(path='./data/'+folder) as it:
-                currentFiles = [x.name for x in it if x.name != ".gitignore"]  # store name attributes of all files in a folder
-                for fileName in currentFiles:
+        with stage(self.instrument, "validate_files") as counts:
+            manifest = self.get_manifest()
+            for folder in self.folderNames:
+                for entry in manifest:
+                    if entry["folder"] != folder:
+                        continue
+                    fileName = entry["name"]
                     if not fileName.endswith(".csv"):  # validate filetype is a csv
                         raise ValidatorException(f"File Type is not csv: {fileName}")
-                    if not re.match(r"\d{4}", fileName[:4]):  # validate that first four digits of file name is a year
+                    # validate that first four digits of file name is a year
+                    if not re.match(r"\d{4}", fileName[:4]):
                         raise ValidatorException(f"File name must start with YYYY: {fileName}")
-            it.close()  # Explicity close the iterator to free memory
-            print(f"All files validated within {folder}")
-        print("Files validated")
+                print(f"All files validated within {folder}")
+            counts["files"] = len(manifest)
+            print("Files validated")
 
     def validate_data(self, dataframefile):
-        # dfs is a dictionary of dataframes
-        dfs = {}
-        for folder in self.folderNames:
-            with os.scandir(path='./data/'+folder) as it:
-                currentFiles = [x.name for x in it if x.name != ".gitignore"]  # store name attributes of all files in a folders
-                for fileName in currentFiles:
-                    df = dataframefile.read(os.path.join('./data/', folder, fileName))
-                    # check the column titles
-                    for col in df.columns:
+        # dfs maps each year and folder to its dataframe, read when first used
+        with stage(self.instrument, "validate_data") as counts:
+            manifest = [entry for entry in self.get_manifest() if self.years is None or entry["year"] in self.years]
+            for folder in self.folderNames:
+                for entry in manifest:
+                    if entry["folder"] != folder:
+                        continue
+                    # check the column titles, reading only the header line
+                    for col in dataframefile.read_header(entry["path"]):
                         if type(col) is not str:  # ensure column names are string types
-                            raise ValidatorException(f"File {fileName} needs to be formatted correctly: {col}")
-                    # if column names are valid, then we can safely store the dataframe to our master dictionary
-                    dfs[fileName[:4] + folder] = df
-                    # i.e. dfs['2016carbon_data']
-            it.close()
-            print(f"All data validated within {folder}")
-        print("Data validated")
-        return dfs
+                            raise ValidatorException(f"File {entry['name']} needs to be formatted correctly: {col}")
+                print(f"All data validated within {folder}")
+            # if column names are valid, then we can safely hand the files to our master dictionary
+            aggregateFolders = [folder for folder in self.folderNames
+                                if self.aggregateEquity and folder == "equity_data"]
+            dfs = LazyFrames(manifest, dataframefile, aggregateFolders=aggregateFolders, chunkSize=self.chunkSize,
+                             schema=self.schema, instrument=self.instrument)
+            counts["files"] = len(manifest)
+            if self.workers > 1:
+                dfs.load_all(self.workers, self.maxInflightBytes, executor=self.executor)
+            print("Data validated")
+            return dfs
@@ -1,3 +1,9 @@
+import hashlib
+import io
+import os
+import pickle
+import sqlite3
+
 import pandas as pd
 from datetime import datetime, date
 
@@ -6,27 +12,212 @@ class DataFrameFileException(Exception):
     pass
 
 
+# columns of the store's tables that are indexed, for looking results up by year, portfolio, company or stock
+STORE_INDEXES = ["Year", "Portfolio", "Company(Company)", "Stocks"]
+
+
+def quote(name):
+    # quotes a table or column name such as Coal(tCO2) for use in SQL
+    return '"' + str(name).replace('"', '""') + '"'
+
+
 class DataFrameFile:
     """ Wrapper around dataframe supporting file operations"""
-    def __init__(self, data=None):
+    def __init__(self, data=None, cacheDir=None, store=None, portfolio=""):
         self.data = data
+        self.cacheDir = cacheDir  # folder of parsed frames kept between runs, None to always parse
+        self.store = store  # SQLite file every written frame is also loaded into, None to only write csv files
+        self.portfolio = portfolio  # the client the written frames are stored under, so one store holds many
 
     def read(self, fileName):
         """Read in filename, store in self.data"""
-        self.data = pd.read_csv(fileName, encoding="ISO-8859-1")  # make sure fileName is correct
+        self.data = self.load(fileName)
         return self.data
 
-    def write(self, fileName, path=None):
-        """Write current dataframe to fileName"""
+    def load(self, fileName):
+        """Read in filename and return it without storing it in self.data"""
+        # streams and buffers are always parsed, only files on disk can be cached
+        if self.cacheDir is None or not isinstance(fileName, (str, os.PathLike)):
+            return pd.read_csv(fileName, encoding="ISO-8859-1")  # make sure fileName is correct
+
+        path = os.path.abspath(fileName)
+        stat = os.stat(path)
+        cachePath = self.get_cache_path(path)
+        key = {"path": path, "mtime": stat.st_mtime_ns, "size": stat.st_size, "pandas": pd.__version__}
+        content = None
+        data = None
+        touched = False
+        try:
+            with open(cachePath, 'rb') as fd:
+                cachedKey = pickle.load(fd)
+                fresh = all(cachedKey.get(k) == key[k] for k in key)
+                if not fresh and cachedKey.get("pandas") == key["pandas"]:
+                    # a file touched or copied without changing keeps its cached frame
+                    with open(path, 'rb') as csv:
+                        content = csv.read()
+                    touched = cachedKey.get("hash") == hashlib.sha1(content).hexdigest()
+                if fresh or touched:
+                    data = pickle.load(fd)
+        except (OSError, EOFError, AttributeError, ImportError, pickle.UnpicklingError):
+            data = None  # no usable cache, parse the csv
+        if data is not None:
+            if touched:
+                self.write_cache(cachePath, key, content, data)
+            return data
+
+        if content is None:
+            with open(path, 'rb') as csv:
+                content = csv.read()
+        data = pd.read_csv(io.BytesIO(content), encoding="ISO-8859-1")
+        self.write_cache(cachePath, key, content, data)
+        return data
+
+    def aggregate(self, fileName, by="Stocks", column="EndingMarketValue", chunkSize=100000):
+        """Stream fileName in chunks, returning column summed per distinct by value and the column's total"""
+        # only the running aggregate of distinct names is held between chunks, so memory
+        # follows the number of names rather than the number of rows; the other columns
+        # keep the first value of each name
+        aggregate = None
+        total = 0.0
+        for chunk in pd.read_csv(fileName, encoding="ISO-8859-1", chunksize=chunkSize):
+            if by not in chunk.columns or column not in chunk.columns:
+                raise DataFrameFileException(f"{fileName} needs {by} and {column} columns to aggregate")
+            total += float(chunk[column].sum())
+            partial = self.fold(chunk, by, column)
+            aggregate = partial if aggregate is None else self.fold(pd.concat([aggregate, partial]), by, column)
+        if aggregate is None:  # a header without rows
+            return pd.DataFrame(columns=self.read_header(fileName)), total
+        return aggregate.reset_index(drop=True), total
+
+    def total(self, fileName, column="EndingMarketValue", chunkSize=100000):
+        """Return the sum of column in fileName, from the cached frame if there is one or else
+        by streaming only that column in chunks"""
+        if self.cacheDir is not None and isinstance(fileName, (str, os.PathLike)):
+            data = self.load(fileName)
+            if column not in data.columns:
+                raise DataFrameFileException(f"{fileName} needs a {column} column to total")
+            return float(data[column].sum())
+        total = 0.0
+        try:
+            for chunk in pd.read_csv(fileName, encoding="ISO-8859-1", usecols=[column], chunksize=chunkSize):
+                total += float(chunk[column].sum())
+        except ValueError as e:  # usecols names a column the file doesn't have
+            raise DataFrameFileException(f"{fileName} needs a {column} column to total: {e}")
+        return total
+
+    @staticmethod
+    def fold(df, by, column):
+        # collapse df to one row per by value in order of first appearance, rows without
+        # a by value forming one row of their own so the frame still adds up to the total;
+        # groupby drops missing keys, so they are grouped by whether they are missing as well
+        keys = [df[by].isnull().values, df[by].fillna("").values]
+        grouped = df.groupby(keys, sort=False)
+        folded = grouped.first()
+        folded[column] = grouped[column].sum(min_count=1)
+        return folded.reset_index(drop=True)[df.columns]
+
+    def read_header(self, fileName):
+        """Return the column names of fileName, parsing only its header line"""
+        return pd.read_csv(fileName, encoding="ISO-8859-1", nrows=0).columns
+
+    def get_cache_path(self, path):
+        return os.path.join(self.cacheDir, hashlib.sha1(path.encode()).hexdigest() + '.pkl')
+
+    def write_cache(self, cachePath, key, content, data):
+        # the key is pickled ahead of the frame so freshness is checked without loading the frame
+        os.makedirs(self.cacheDir, exist_ok=True)
+        key = dict(key, hash=hashlib.sha1(content).hexdigest())
+        tmpPath = f"{cachePath}.{os.getpid()}.tmp"
+        with open(tmpPath, 'wb') as fd:
+            pickle.dump(key, fd, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, fd, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, cachePath)
+
+    def write(self, fileName, path=None, data=None):
+        """Write current dataframe, or data if given, to fileName"""
+        # writing data passed in leaves self.data alone, so several threads can write at once
+        if data is None:
+            data = self.data
         # if data is none raise exception
-        if self.data is None:
+        if data is None:
             raise DataFrameFileException("No data to write.")
         if not path.endswith('/'):
             path += '/'
 
-        self.data.to_csv(path + fileName + '.csv')  # make sure fileName is correct
+        data.to_csv(path + fileName + '.csv')  # make sure fileName is correct
+        if self.store is not None:
+            # 2016benchmarks goes into the benchmarks table as the rows of 2016
+            if fileName[:4].isdigit():
+                self.write_store(fileName[4:], data, year=fileName[:4], portfolio=self.portfolio)
+            else:
+                self.write_store(fileName, data, portfolio=self.portfolio)
         # commenting out file prefixes with run date for readability
-        #self.data.to_csv(path + self.get_file_prefix() + fileName + '.csv')  # make sure fileName is correct
+        #data.to_csv(path + self.get_file_prefix() + fileName + '.csv')  # make sure fileName is correct
+
+    def connect(self):
+        if self.store is None:
+            raise DataFrameFileException("No store to use, pass store= the path of a SQLite file")
+        # years written on several threads each get a connection, waiting on each other's transactions
+        return sqlite3.connect(self.store, timeout=60)
+
+    def write_store(self, table, data, year=None, portfolio=""):
+        """Replace the rows of year and portfolio in table of the store with data, in one transaction"""
+        data = data.reset_index(drop=True).assign(Year=year, Portfolio=portfolio)
+        data = data.loc[:, ["Year", "Portfolio"] + [col for col in data.columns if col not in ("Year", "Portfolio")]]
+        # NaN is stored as NULL and numpy numbers as python ones
+        rows = data.astype(object).where(data.notnull(), None).itertuples(index=False, name=None)
+        con = self.connect()
+        try:
+            with con:
+                existing = [row[1] for row in con.execute(f"PRAGMA table_info({quote(table)})")]
+                if not existing:
+                    con.execute(f"CREATE TABLE {quote(table)} ({', '.join(quote(col) for col in data.columns)})")
+                for col in data.columns:
+                    if existing and col not in existing:  # a fuel the table hasn't had before
+                        con.execute(f"ALTER TABLE {quote(table)} ADD COLUMN {quote(col)}")
+                    if col in STORE_INDEXES:
+                        con.execute(f"CREATE INDEX IF NOT EXISTS {quote(table + '_' + col)} "
+                                    f"ON {quote(table)} ({quote(col)})")
+                con.execute(f"DELETE FROM {quote(table)} WHERE Year IS ? AND Portfolio IS ?", (year, portfolio))
+                con.executemany(f"INSERT INTO {quote(table)} ({', '.join(quote(col) for col in data.columns)}) "
+                                f"VALUES ({', '.join('?' * len(data.columns))})", rows)
+        finally:
+            con.close()
+
+    def query(self, table, years=None, portfolios=None, companies=None, stocks=None, columns=None, where=None,
+              params=(), orderBy=None, ascending=True, limit=None):
+        """Return the rows of table in the store matching every filter given, filtered and sorted by SQLite"""
+        # years, portfolios, companies and stocks are lists matched against the indexed columns; where is
+        # any further SQL condition with ? placeholders for params, such as '"Coal(tCO2)" > ?'
+        clauses = []
+        values = []
+        for col, wanted in [("Year", years), ("Portfolio", portfolios), ("Company(Company)", companies),
+                            ("Stocks", stocks)]:
+            if wanted is not None:
+                wanted = [str(value) for value in wanted] if col == "Year" else list(wanted)
+                clauses.append(f"{quote(col)} IN ({', '.join('?' * len(wanted))})")
+                values.extend(wanted)
+        if where is not None:
+            clauses.append(f"({where})")
+            values.extend(params)
+        selected = "*" if columns is None else ", ".join(quote(col) for col in columns)
+        sql = f"SELECT {selected} FROM {quote(table)}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        if orderBy is not None:
+            sql += f" ORDER BY {quote(orderBy)} {'ASC' if ascending else 'DESC'}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            values.append(limit)
+        if not os.path.exists(self.store or ""):
+            raise DataFrameFileException(f"No store at {self.store}")
+        con = self.connect()
+        try:
+            return pd.read_sql_query(sql, con, params=values)
+        except (sqlite3.DatabaseError, pd.io.sql.DatabaseError) as e:  # pandas wraps the sqlite error
+            raise DataFrameFileException(f"Could not query {table} in {self.store}: {e}")
+        finally:
+            con.close()
 
     @staticmethod
     def get_file_prefix(today=date.today()):
@@ -0,0 +1,118 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource  # not available on Windows, where peak memory is not recorded
+except ImportError:
+    resource = None
+
+
+# the CPU time of the running thread, so years run on threads are not charged for each other;
+# Python 3.6 has no thread_time, so there it is the CPU time of the whole process
+cpu_time = getattr(time, "thread_time", time.process_time)
+
+
+class InstrumentException(Exception):
+    pass
+
+
+def peak_rss():
+    # returns the peak resident memory of this process in bytes, or None where it can't be read
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes and macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def stage(instrument, name, year=None):
+    # returns a context timing stage name of year with instrument, or doing nothing when instrument
+    # is None, either way yielding a dict to add counts such as rows to
+    if instrument is None:
+        return _untimed()
+    return instrument.stage(name, year)
+
+
+@contextmanager
+def _untimed():
+    # contextlib.nullcontext is only in Python 3.7 and newer
+    yield {}
+
+
+class Instrument:
+    """Records the wall time, CPU time, peak memory and row counts of each stage of a run"""
+    def __init__(self):
+        self.records = []  # one dict per stage run, in the order the stages finished
+        self.started = time.time()
+        self.lock = threading.Lock()  # years run on threads record at once
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, year=None):
+        """Time the body of a with block as stage name of year, yielding a dict for counts such as rows"""
+        counts = {}
+        startRss = peak_rss()
+        startTime = time.time()
+        startWall = time.perf_counter()
+        startCpu = cpu_time()
+        try:
+            yield counts
+        finally:
+            record = {"stage": name, "year": year, "start": startTime - self.started,
+                      "wall": time.perf_counter() - startWall, "cpu": cpu_time() - startCpu}
+            endRss = peak_rss()
+            record["peakRss"] = endRss
+            record["rssGrowth"] = endRss - startRss if endRss is not None else None
+            record.update(counts)
+            with self.lock:
+                self.records.append(record)
+
+    def merge(self, records):
+        """Add the records of a copy of this instrument that ran in a worker process"""
+        with self.lock:
+            self.records.extend(records)
+
+    def to_frame(self):
+        """Return the records as a dataframe with a row per stage run, for the notebook"""
+        return pd.DataFrame(self.records)
+
+    def summary(self):
+        """Return the total wall and CPU time, highest peak memory and total counts of each stage"""
+        df = self.to_frame()
+        if df.empty:
+            return df
+        # counts that aren't numbers, such as the file a read stage read, are left out
+        totals = df.drop(columns=["year", "start", "peakRss", "rssGrowth"]).groupby("stage", sort=False)
+        totals = totals.sum(numeric_only=True)
+        totals["peakRss"] = df.groupby("stage", sort=False)["peakRss"].max()
+        return totals
+
+    def to_json(self, path=None):
+        """Return the records as json, also writing them to path if one is given"""
+        data = json.dumps({"started": self.started, "stages": self.records}, indent=1, default=float)
+        if path is not None:
+            with open(path, 'w') as fd:
+                fd.write(data)
+        return data
+
+    @staticmethod
+    def read_json(path):
+        """Return the records of a run written by to_json as a dataframe, to compare runs"""
+        with open(path) as fd:
+            data = json.load(fd)
+        if "stages" not in data:
+            raise InstrumentException(f"Not an instrument file: {path}")
+        return pd.DataFrame(data["stages"])
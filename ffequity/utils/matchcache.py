@@ -0,0 +1,87 @@
+import os
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class MatchCacheException(Exception):
+    pass
+
+
+class MatchCache:
+    """On-disk store of fuzzy match scores keyed by scorer version and normalized name pair"""
+    def __init__(self, path, maxEntries=1000000):
+        if maxEntries < 1:
+            raise MatchCacheException(f"Cache must hold at least one entry: {maxEntries}")
+        self.path = path
+        self.maxEntries = maxEntries
+        self.scores = OrderedDict()  # least recently used first
+        # (key, score) put since the last save by a copy of the cache in a worker process, for the
+        # parent to merge; the cache in the main process doesn't track them, as they are already in scores
+        self.added = []
+        self.trackAdded = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()  # years matched on threads share the cache
+        self.load()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+        # the cache is only pickled to be sent to a worker process, whose new scores go back to the parent
+        self.added = []
+        self.trackAdded = True
+
+    def load(self):
+        """Read the stored scores from self.path if the file exists"""
+        if not os.path.exists(self.path):
+            return self.scores
+        with open(self.path, 'rb') as fd:
+            scores = pickle.load(fd)
+        if not isinstance(scores, OrderedDict):
+            raise MatchCacheException(f"Not a match cache: {self.path}")
+        self.scores = scores
+        self.evict()
+        return self.scores
+
+    def save(self):
+        """Write the scores to self.path, replacing the old file only once the new one is complete"""
+        tmpPath = self.path + '.tmp'
+        with self.lock, open(tmpPath, 'wb') as fd:
+            pickle.dump(self.scores, fd, protocol=pickle.HIGHEST_PROTOCOL)
+            self.added = []
+        os.replace(tmpPath, self.path)
+
+    def get(self, key):
+        """Return the cached score for key, or None if it has never been scored"""
+        with self.lock:
+            score = self.scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.scores.move_to_end(key)
+            return score
+
+    def put(self, key, score):
+        """Store score for key, evicting the least recently used scores beyond maxEntries"""
+        with self.lock:
+            self.scores[key] = score
+            self.scores.move_to_end(key)
+            if self.trackAdded:
+                self.added.append((key, score))
+            self.evict()
+
+    def snapshot(self):
+        """Return a plain dict of the cached scores to hand to worker processes"""
+        with self.lock:
+            return dict(self.scores)
+
+    def evict(self):
+        while len(self.scores) > self.maxEntries:
+            self.scores.popitem(last=False)
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+
+class RunManifestException(Exception):
+    pass
+
+
+class RunManifest:
+    """Record of what each year's outputs were computed from, so years whose inputs are unchanged are not rerun"""
+    def __init__(self, path):
+        self.path = path
+        self.stages = {}  # {stage: {year: {"inputs": fingerprint, "output": hash of the file written}}}
+        self.files = {}  # {path: [size, mtime, hash]} so unchanged files are not hashed again
+        self.load()
+
+    def load(self):
+        """Read the manifest from self.path if the file exists"""
+        if not os.path.exists(self.path):
+            return self.stages
+        with open(self.path) as fd:
+            manifest = json.load(fd)
+        if not isinstance(manifest, dict) or "stages" not in manifest:
+            raise RunManifestException(f"Not a run manifest: {self.path}")
+        self.stages = manifest["stages"]
+        self.files = manifest.get("files", {})
+        return self.stages
+
+    def save(self):
+        """Write the manifest to self.path, replacing the old file only once the new one is complete"""
+        tmpPath = self.path + '.tmp'
+        with open(tmpPath, 'w') as fd:
+            json.dump({"stages": self.stages, "files": self.files}, fd, indent=1, sort_keys=True)
+        os.replace(tmpPath, self.path)
+
+    def hash_file(self, path):
+        """Return the sha1 of a file's content, reusing the last hash while its size and mtime are unchanged"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return known[2]
+        sha = hashlib.sha1()
+        with open(path, 'rb') as fd:
+            for block in iter(lambda: fd.read(1 << 20), b''):
+                sha.update(block)
+        self.files[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+        return sha.hexdigest()
+
+    def hash_input(self, dfs, key):
+        """Return a hash of the data behind dfs[key], from its file when dfs knows where it was read from"""
+        entry = getattr(dfs, "manifest", {}).get(key)
+        if entry is not None:
+            return self.hash_file(entry["path"])
+        # frames built in memory are hashed by content
+        df = dfs[key]
+        rows = pd.util.hash_pandas_object(df, index=False).values
+        return hashlib.sha1(rows.tobytes() + repr(list(df.columns)).encode()).hexdigest()
+
+    def is_current(self, stage, year, fingerprint, outputPath):
+        """Return True if year's stage output was written from the same fingerprint and is unchanged since"""
+        record = self.stages.get(stage, {}).get(year)
+        if record is None or record["inputs"] != fingerprint or not os.path.exists(outputPath):
+            return False
+        # an output rewritten by something else no longer matches what the inputs produced
+        return record["output"] == self.hash_file(outputPath)
+
+    def record(self, stage, year, fingerprint, outputPath):
+        """Remember that year's stage output at outputPath was computed from fingerprint"""
+        self.stages.setdefault(stage, {})[year] = {"inputs": fingerprint, "output": self.hash_file(outputPath)}
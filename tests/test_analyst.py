@@ -0,0 +1,314 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import pandas as pd
+
+from ffequity.processors.analyst import (
+    Analyst,
+    AnalystException,
+)
+from ffequity.processors.schema import Schema
+from ffequity.processors.validator import Validator
+from ffequity.utils.dataframefile import DataFrameFile
+from ffequity.utils.instrument import Instrument
+from ffequity.utils.matchcache import MatchCache
+from ffequity.utils.runmanifest import RunManifest
+
+
+class TestMatchExact(TestCase):
+    '''
+    Test the match_exact() function from Analyst
+    '''
+
+    def test_joins_on_normalized_names(self):
+        '''
+        Test that stocks are joined to carbon companies ignoring case, punctuation and share classes
+        '''
+        equity = pd.DataFrame({"Stocks": ["ROYAL DUTCH SHELL A", "ENI OPTION B", "CLOTHES R US", None],
+                               "EndingMarketValue": [1.0, 2.0, 3.0, 4.0]})
+        carbon = pd.DataFrame({"Company(Company)": ["ENI", "Royal Dutch Shell", "Royal Dutch Shell plc"],
+                               "Coal(GtCO2)": [0.0, 0.0, 0.0]})
+        exactPairs = Analyst({}).match_exact(equity, carbon)
+        self.assertEqual(exactPairs.values.tolist(), [[0, 1, 100], [0, 2, 100], [1, 0, 100]])
+
+
+class TestMatchEquity(TestCase):
+    '''
+    Test the match_equity() function from Analyst
+    '''
+
+    def setUp(self):
+        '''
+        Sets up equity data with a repeated stock and carbon data with a company split over two rows
+        '''
+        self.equity = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "CONOC PHILLIP", "CONSOL STOCK A", "PEAR INC"],
+                                    "EndingMarketValue": [10.0, 20.0, 30.0, 40.0]})
+        self.carbon = pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ConocoPhillips", "ConocoPhillips"],
+                                    "Coal(GtCO2)": [2.0, 0.0, 1.0],
+                                    "Oil(GtCO2)": [0.0, 2.0, 0.0]})
+
+    def test_matched_rows_hold_carbon_data(self):
+        '''
+        Test that every equity row is kept in order with the data of its matched company
+        '''
+        analyst = Analyst({})
+        matchedDf = analyst.match_equity("2012", self.equity, self.carbon)
+        self.assertEqual(matchedDf.loc[:, "Stocks"].tolist(), self.equity.loc[:, "Stocks"].tolist())
+        self.assertEqual(matchedDf.loc[[0, 2], "Company(Company)"].tolist(), ["CONSOL Energy"] * 2)
+        assert pd.isnull(matchedDf.loc[3, "Company(Company)"])
+
+    def test_duplicate_carbon_rows_are_summed(self):
+        '''
+        Test that a company listed on two carbon rows is joined once with its reserves summed
+        '''
+        matchedDf = Analyst({}).match_equity("2012", self.equity, self.carbon)
+        self.assertEqual(matchedDf.loc[1, ["Coal(GtCO2)", "Oil(GtCO2)"]].tolist(), [1.0, 2.0])
+
+    def test_records_match_stats(self):
+        '''
+        Test that the rows resolved by each matching stage are recorded for the year
+        '''
+        analyst = Analyst({})
+        analyst.match_equity("2012", self.equity, self.carbon)
+        stats = analyst.matchStats["2012"]
+        self.assertEqual((stats["exact"], stats["fuzzy"], stats["unmatched"]), (0, 3, 1))
+
+
+class TestMatchFinance(TestCase):
+    '''
+    Test the match_finance() function from Analyst
+    '''
+
+    def setUp(self):
+        '''
+        Sets up matched data and financial data listing one company twice
+        '''
+        self.matchedDf = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "CONSOL B", "ENI OPTION B", "PEAR INC"],
+                                       "Company(Company)": ["CONSOL Energy", "CONSOL Energy", "ENI", None]})
+        self.financial = pd.DataFrame({"Company(Company)": ["ENI", "CONSOL Energy", "CONSOL Energy"],
+                                       "MarketCap(B)": [71.0, 3.7, 4.1]})
+
+    def test_joins_market_caps(self):
+        '''
+        Test that every row of a matched company gets its market cap and unmatched rows get none
+        '''
+        analyst = Analyst({})
+        matchedDf = analyst.match_finance("2012", self.matchedDf.copy(), self.financial)
+        self.assertEqual(matchedDf.loc[:2, "MarketCap(B)"].tolist(), [3.7, 3.7, 71.0])
+        assert pd.isnull(matchedDf.loc[3, "MarketCap(B)"])
+        self.assertEqual(analyst.financeStats["2012"], {"matched": 2, "unmatched": 0})
+
+    def test_duplicate_policies(self):
+        '''
+        Test that duplicate market caps follow the chosen policy
+        '''
+        for policy, expected in [("last", 4.1), ("mean", 3.9)]:
+            analyst = Analyst({}, marketCapDuplicates=policy)
+            matchedDf = analyst.match_finance("2012", self.matchedDf.copy(), self.financial)
+            self.assertAlmostEqual(matchedDf.loc[0, "MarketCap(B)"], expected)
+        with self.assertRaises(AnalystException):
+            Analyst({}, marketCapDuplicates="raise").match_finance("2012", self.matchedDf.copy(), self.financial)
+
+    def test_counts_unmatched_companies(self):
+        '''
+        Test that carbon companies missing from the financial data are counted
+        '''
+        analyst = Analyst({})
+        analyst.match_finance("2012", self.matchedDf.copy(), self.financial.iloc[:1])
+        self.assertEqual(analyst.financeStats["2012"], {"matched": 1, "unmatched": 1})
+
+
+class TestCombineMultipleStocks(TestCase):
+    '''
+    Test the combine_multiple_stocks() function from Analyst
+    '''
+
+    def test_combines_stocks_of_one_company(self):
+        '''
+        Test that a company's stocks are combined into its first row with holdings and carbon summed
+        '''
+        df = pd.DataFrame({"Stocks": ["RDS A", "ENI B", "RDS B"],
+                           "Company(Company)": ["Royal Dutch Shell", "ENI", "Royal Dutch Shell"],
+                           "EndingMarketValue": [10.0, 5.0, 20.0],
+                           "Lignite(GtCO2)": [2.0, 1.0, 2.0],
+                           "LigniteIntensity(GtCO2)/$B": [0.5, 0.2, 0.5],
+                           "Lignite(tCO2)": [5.0, 1.0, 10.0]})
+        combined = Analyst({}).combine_multiple_stocks(df, {"Lignite": "(GtCO2)"})
+        self.assertEqual(combined.loc[:, "Stocks"].tolist(), ["RDS A", "ENI B"])
+        self.assertEqual(combined.loc[0, ["EndingMarketValue", "Lignite(tCO2)"]].tolist(), [30.0, 15.0])
+        self.assertEqual(combined.loc[0, ["Lignite(GtCO2)", "LigniteIntensity(GtCO2)/$B"]].tolist(), [2.0, 0.5])
+
+
+class TestAnalyzeCarbon(TestCase):
+    '''
+    Test the analyze_carbon() function from Analyst
+    '''
+
+    def test_uses_matched_data_in_memory(self):
+        '''
+        Test that matched data handed over from analyze_equity is allocated without any files
+        '''
+        dfs = {
+            "2012equity_data": pd.DataFrame({"Stocks": ["CONSOL STOCK A", "ENI OPTION B", "PEAR INC"],
+                                             "EndingMarketValue": [10.0, 20.0, 30.0]}),
+            "2012carbon_data": pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI"],
+                                             "Coal(GtCO2)": [2.0, 0.0], "Oil(GtCO2)": [0.0, 1.0]}),
+            "2012financial_data": pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI"],
+                                                "MarketCap(B)": [4.0, 10.0]}),
+        }
+        analyst = Analyst(dfs)
+        matchedData = analyst.analyze_equity(None, write=False)
+        analyzedData = analyst.analyze_carbon(None, matchedData=matchedData, write=False)
+        df = analyzedData["2012"].set_index("Company(Company)")
+        self.assertEqual(df.loc["CONSOL Energy", "Coal(tCO2)"], 5.0)
+        self.assertEqual(df.loc["ENI", "Oil(tCO2)"], 2.0)
+
+
+class TestIncrementalRuns(TestCase):
+    '''
+    Test that Analyst only recomputes the years whose inputs changed
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary working directory with the output folders and data for two years
+        '''
+        self.cwd = os.getcwd()
+        self.tmpDir = tempfile.TemporaryDirectory()
+        os.chdir(self.tmpDir.name)
+        for folder in ["assessment", "benchmarks", "financial_data"]:
+            os.makedirs(os.path.join("data", folder))
+        self.dfs = {}
+        for year in ["2012", "2013"]:
+            self.dfs[year + "equity_data"] = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "PEAR INC"],
+                                                           "EndingMarketValue": [10.0, 20.0]})
+            self.dfs[year + "carbon_data"] = pd.DataFrame({"Company(Company)": ["CONSOL Energy"],
+                                                           "Coal(GtCO2)": [2.0]})
+            self.dfs[year + "financial_data"] = pd.DataFrame({"Company(Company)": ["CONSOL Energy"],
+                                                              "MarketCap(B)": [4.0]})
+
+    def tearDown(self):
+        '''
+        Returns to the original working directory and removes the temporary one
+        '''
+        os.chdir(self.cwd)
+        self.tmpDir.cleanup()
+
+    def test_reruns_only_changed_years(self):
+        '''
+        Test that a second pipeline run recomputes only the year whose equity data changed
+        '''
+        first = Analyst(self.dfs, runManifest=RunManifest("data/runmanifest.json"))
+        self.assertEqual(sorted(first.analyze_pipeline(DataFrameFile())), ["2012", "2013"])
+        self.dfs["2013equity_data"].loc[0, "EndingMarketValue"] = 30.0
+        second = Analyst(self.dfs, runManifest=RunManifest("data/runmanifest.json"))
+        analyzedData = second.analyze_pipeline(DataFrameFile())
+        self.assertEqual(list(analyzedData), ["2013"])
+        self.assertEqual(list(second.matchStats), ["2013"])
+        benchmarks = pd.read_csv("data/benchmarks/2013benchmarks.csv")
+        self.assertEqual(benchmarks.loc[0, "Coal(tCO2)"], 15.0)
+
+    def test_turning_on_the_store_reruns_every_year(self):
+        '''
+        Test that a store turned on after a recorded run, or deleted since, is filled rather than left missing
+        '''
+        Analyst(self.dfs, runManifest=RunManifest("data/runmanifest.json")).analyze_pipeline(DataFrameFile())
+        dataframefile = DataFrameFile(store="data/results.sqlite")
+        results = []
+        for _ in range(2):
+            analyst = Analyst(self.dfs, runManifest=RunManifest("data/runmanifest.json"))
+            results.append(sorted(analyst.analyze_pipeline(dataframefile)))
+        self.assertEqual(results, [["2012", "2013"], []])
+        self.assertEqual(sorted(dataframefile.query("benchmarks").loc[:, "Year"].unique()), ["2012", "2013"])
+        os.remove("data/results.sqlite")
+        analyst = Analyst(self.dfs, runManifest=RunManifest("data/runmanifest.json"))
+        self.assertEqual(sorted(analyst.analyze_pipeline(dataframefile)), ["2012", "2013"])
+        self.assertEqual(len(dataframefile.query("benchmarks", years=["2013"]).index),
+                         len(pd.read_csv("data/benchmarks/2013benchmarks.csv").index))
+
+    def test_changed_settings_rerun_every_year(self):
+        '''
+        Test that a new match threshold or a new way of reading the files recomputes years whose data is unchanged
+        '''
+        Analyst(self.dfs, runManifest=RunManifest("data/runmanifest.json")).analyze_equity(DataFrameFile())
+        analyst = Analyst(self.dfs, thresh=80, runManifest=RunManifest("data/runmanifest.json"))
+        self.assertEqual(sorted(analyst.analyze_equity(DataFrameFile())), ["2012", "2013"])
+
+        for key, df in self.dfs.items():
+            os.makedirs(os.path.join("inputs", key[4:]), exist_ok=True)
+            df.to_csv(os.path.join("inputs", key[4:], key + ".csv"), index=False)
+        results = []
+        for schema in [None, None, Schema(floatType="float32")]:
+            dfs = Validator(["equity_data", "carbon_data"], dataPath="inputs", schema=schema).validate(DataFrameFile())
+            analyst = Analyst(dfs, runManifest=RunManifest("data/runmanifest.json"))
+            results.append(sorted(analyst.analyze_equity(DataFrameFile())))
+        self.assertEqual(results, [["2012", "2013"], [], ["2012", "2013"]])
+
+
+class TestRunYears(TestCase):
+    '''
+    Test the run_years() function from Analyst
+    '''
+
+    def setUp(self):
+        '''
+        Sets up equity and carbon data for three years
+        '''
+        self.dfs = {}
+        for year in ["2012", "2013", "2014"]:
+            self.dfs[year + "equity_data"] = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "ENI OPTION B", "PEAR INC"],
+                                                           "EndingMarketValue": [10.0, 20.0, float(year)]})
+            self.dfs[year + "carbon_data"] = pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI"],
+                                                           "Coal(GtCO2)": [2.0, 0.0]})
+
+    def test_parallel_years_match_serial(self):
+        '''
+        Test that years run on threads or processes give the serial results and statistics
+        '''
+        serial = Analyst(self.dfs)
+        expected = serial.analyze_equity(None, write=False)
+        for yearExecutor in ["thread", "process"]:
+            analyst = Analyst(self.dfs, yearWorkers=2, yearExecutor=yearExecutor)
+            matchedData = analyst.analyze_equity(None, write=False)
+            self.assertEqual(list(matchedData), ["2012", "2013", "2014"])
+            for year in expected:
+                pd.testing.assert_frame_equal(matchedData[year], expected[year])
+            self.assertEqual(analyst.matchStats, serial.matchStats)
+
+    def test_scores_from_workers_reach_cache(self):
+        '''
+        Test that the scores matched in worker processes are kept by the cache of the main process
+        '''
+        # stock names sharing no word with a carbon company are fuzzy scored
+        dfs = dict(self.dfs)
+        for year in ["2012", "2013"]:
+            dfs[year + "equity_data"] = pd.DataFrame({"Stocks": ["CONSOLENERGY", "PEAR INC"],
+                                                      "EndingMarketValue": [10.0, 5.0]})
+        with tempfile.TemporaryDirectory() as tmpDir:
+            matchCache = MatchCache(os.path.join(tmpDir, "matchcache.pkl"))
+            analyst = Analyst(dfs, yearWorkers=2, yearExecutor="process", matchCache=matchCache)
+            analyst.analyze_equity(None, write=False)
+            scores = len(matchCache.scores)
+            self.assertGreater(scores, 0)
+            self.assertEqual(len(MatchCache(os.path.join(tmpDir, "matchcache.pkl")).scores), scores)
+
+    def test_stages_recorded_from_workers(self):
+        '''
+        Test that the stages years run in worker processes record reach the instrument with their counts
+        '''
+        instrument = Instrument()
+        analyst = Analyst(self.dfs, yearWorkers=2, yearExecutor="process", instrument=instrument)
+        analyst.analyze_equity(None, write=False)
+        records = instrument.to_frame().set_index("year")
+        self.assertEqual(sorted(records.index), ["2012", "2013", "2014"])
+        self.assertEqual(set(records.loc[:, "stage"]), {"match_equity"})
+        self.assertEqual(records.loc["2012", "rows"], 3)
+        self.assertEqual(records.loc["2012", "comparisons"], analyst.matchStats["2012"]["comparisons"])
+
+    def test_unknown_executor_raises_exception(self):
+        '''
+        Test that an executor other than thread or process raises AnalystException
+        '''
+        with self.assertRaises(AnalystException):
+            Analyst(self.dfs, yearExecutor="cluster")
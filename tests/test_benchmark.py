@@ -0,0 +1,191 @@
+import io
+import os
+import subprocess
+import sys
+import tempfile
+from contextlib import redirect_stdout
+from unittest import (
+    TestCase,
+    mock,
+)
+
+import numpy as np
+import pandas as pd
+
+from ffequity.processors.benchmark import Benchmark, BenchmarkException, BenchmarkTables, display
+from ffequity.utils.dataframefile import DataFrameFile
+
+
+class TestAggregateTable(TestCase):
+    '''
+    Test the aggregate_table() and aggregate_equity_table() functions from Benchmark
+    '''
+
+    def setUp(self):
+        '''
+        Sets up two years of benchmark tables with a fuel the default tables don't have
+        '''
+        self.data = {
+            "2013": pd.DataFrame({"Stocks": ["CONSOL STOCK A", "ENI OPTION B", "PEAR INC"],
+                                  "EndingMarketValue": [10.0, 20.0, 5.0],
+                                  "Company(Company)": ["CONSOL Energy", "ENI", np.nan],
+                                  "Coal(tCO2)": [4.0, 0.0, np.nan], "Oil(tCO2)": [0.0, 3.0, np.nan],
+                                  "Peat(tCO2)": [4.0, 1.0, np.nan], "Coal(tCO2)Pctile": [1.0, 0.5, np.nan]}),
+            "2012": pd.DataFrame({"Stocks": ["CONSOL STOCK A"], "EndingMarketValue": [8.0],
+                                  "Company(Company)": ["CONSOL Energy"],
+                                  "Coal(tCO2)": [2.0], "Oil(tCO2)": [0.0], "Peat(tCO2)": [0.0]}),
+        }
+        self.totalEquity = {"2012": 100.0, "2013": 200.0}
+
+    def test_allocates_equity_by_fuel(self):
+        '''
+        Test that equity is split by each holding's share of reserves for every fuel in the data
+        '''
+        benchmark = Benchmark(["2013", "2012"], data=self.data)
+        with mock.patch.object(Benchmark, "get_total_equity", return_value=self.totalEquity):
+            results = benchmark.aggregate_table()
+        self.assertEqual(results.index.tolist(), ["2013", "2012"])
+        self.assertEqual(results.columns.tolist(), ["Fossil Fuel Equity", "Total Individual Equity", "Coal Equity",
+                                                    "Oil Equity", "Peat Equity", "Coal Reserves (tCO2)",
+                                                    "Oil Reserves (tCO2)", "Peat Reserves (tCO2)",
+                                                    "Total Reserves (tCO2)"])
+        self.assertEqual(results.loc["2013"].tolist(), [35.0, 200.0, 5.0, 15.0, 10.0, 4.0, 3.0, 5.0, 12.0])
+        self.assertEqual(results.loc["2012"].tolist(), [8.0, 100.0, 8.0, 0.0, 0.0, 2.0, 0.0, 0.0, 2.0])
+
+    def test_equity_table_counts_matched_stocks(self):
+        '''
+        Test that only stocks matched to a carbon company count as fossil fuel equity
+        '''
+        data = {year: df.rename(columns=lambda col: col.replace("(tCO2)", "(GtCO2)")) for year, df in self.data.items()}
+        benchmark = Benchmark(["2013", "2012"], data=data)
+        with mock.patch.object(Benchmark, "get_total_equity", return_value=self.totalEquity):
+            results = benchmark.aggregate_equity_table()
+        self.assertEqual(results.columns.tolist(), ["Fossil Fuel Equity", "Total Individual Equity", "Coal Equity",
+                                                    "Oil Equity", "Peat Equity"])
+        self.assertEqual(results.loc["2013", "Fossil Fuel Equity"], 30.0)
+
+    def test_totals_counted_at_ingestion(self):
+        '''
+        Test that totals passed in, such as those Validator counted while streaming, are used without reading files
+        '''
+        benchmark = Benchmark(["2013", "2012"], data=self.data, totalEquity=self.totalEquity)
+        with mock.patch.object(DataFrameFile, "total") as total:
+            results = benchmark.aggregate_table()
+        total.assert_not_called()
+        self.assertEqual(results.loc[:, "Total Individual Equity"].tolist(), [200.0, 100.0])
+
+    def test_company_trend(self):
+        '''
+        Test that each company's holdings are totalled with a column per year
+        '''
+        trend = Benchmark(["2013", "2012"], data=self.data).company_trend()
+        self.assertEqual(trend.columns.tolist(), ["2012", "2013"])
+        self.assertEqual(trend.loc["CONSOL Energy"].tolist(), [8.0, 10.0])
+        self.assertTrue(np.isnan(trend.loc["ENI", "2012"]))
+
+    def test_tables_read_from_store(self):
+        '''
+        Test that tables written to a store are read back by year and queried across years
+        '''
+        with tempfile.TemporaryDirectory() as tmpDir:
+            store = os.path.join(tmpDir, "results.sqlite")
+            dataframefile = DataFrameFile(store=store)
+            for year, df in self.data.items():
+                dataframefile.write(year + "benchmarks", path=tmpDir, data=df)
+            benchmark = Benchmark(["2012", "2013"], store=store)
+            data = benchmark.get_tables()
+            self.assertEqual(sorted(data), ["2012", "2013"])
+            pd.testing.assert_frame_equal(data["2013"], self.data["2013"])
+            top = benchmark.top_holdings("Coal(tCO2)", rows=2, columns=["Year", "Stocks"])
+            self.assertEqual(top.loc[:, "Year"].tolist(), ["2013", "2012"])
+
+
+class TestHeadless(TestCase):
+    '''
+    Test that the tables of Benchmark don't need the plotting and display libraries
+    '''
+
+    def test_import_skips_plotting(self):
+        '''
+        Test that importing benchmark in a fresh interpreter loads none of matplotlib, mpld3 or IPython
+        beyond what pandas itself imports (pandas before 0.23 registers its matplotlib converters on import)
+        '''
+        code = ("import sys; import pandas; before = set(sys.modules); import ffequity.processors.benchmark; "
+                "print([m for m in ('matplotlib', 'mpld3', 'IPython') if m in set(sys.modules) - before])")
+        loaded = subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, universal_newlines=True,
+                                check=True).stdout
+        self.assertEqual(loaded.strip(), "[]")
+
+    def test_top(self):
+        '''
+        Test that top returns the largest holdings of a year without displaying them
+        '''
+        data = {"2013": pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI", "BP"],
+                                      "Coal(tCO2)": [4.0, 0.0, 1.0], "Oil(tCO2)": [0.0, 3.0, 2.0],
+                                      "Gas(tCO2)": [0.0, 1.0, 0.0], "EndingMarketValue": [10.0, 20.0, 5.0]})}
+        tables = BenchmarkTables(["2013"], data=data)
+        self.assertEqual(tables.top("2013", rows=2).loc[:, "Company(Company)"].tolist(), ["ENI", "CONSOL Energy"])
+        self.assertEqual(tables.top("2013", rows=1, sort="OIL").loc[:, "Company(Company)"].tolist(), ["ENI"])
+
+    def test_display_prints_without_ipython(self):
+        '''
+        Test that tables are printed when IPython can't be imported
+        '''
+        out = io.StringIO()
+        with mock.patch.dict(sys.modules, {"IPython.display": None}), redirect_stdout(out):
+            display(pd.DataFrame({"Stocks": ["PEAR INC"]}))
+        self.assertIn("PEAR INC", out.getvalue())
+
+
+class TestScatterPoints(TestCase):
+    '''
+    Test the scatter_points() function from Benchmark
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a year of 2000 holdings with one far outlier in reserves
+        '''
+        rng = np.random.RandomState(0)
+        rows = 2000
+        df = pd.DataFrame({"Company(Company)": [f"Company {i}" for i in range(rows)],
+                           "EndingMarketValue": rng.lognormal(14.0, 1.0, rows),
+                           "Coal(tCO2)": rng.lognormal(10.0, 1.0, rows), "Oil(tCO2)": 0.0, "Gas(tCO2)": 0.0})
+        df.loc[7, "Coal(tCO2)"] = 1e12
+        self.df = df
+        self.benchmark = BenchmarkTables(["2016"], data={"2016": df})
+
+    def test_small_years_keep_every_holding(self):
+        '''
+        Test that every holding is drawn when there are no more than maxPoints of them
+        '''
+        points = self.benchmark.scatter_points("2016", maxPoints=None)
+        self.assertEqual(len(points.index), 2000)
+        self.assertEqual(points.loc[:, "Count"].tolist(), [1] * 2000)
+
+    def test_large_years_are_bounded(self):
+        '''
+        Test that at most maxPoints stand for every holding, with the top holdings and outliers drawn exactly
+        '''
+        points = self.benchmark.scatter_points("2016", maxPoints=200, topN=5)
+        self.assertLessEqual(len(points.index), 200)
+        self.assertEqual(points.loc[:, "Count"].sum(), 2000)
+        totalEquity = self.df.loc[:, "EndingMarketValue"].sum()
+        self.assertAlmostEqual(points.loc[:, "EndingMarketValue"].mul(points.loc[:, "Count"]).sum(), totalEquity,
+                               delta=1e-6 * totalEquity)
+        exact = points.loc[points.loc[:, "Count"] == 1].set_index("Company(Company)")
+        self.assertEqual(exact.loc["Company 7", "Reserves"], 1e12)
+        largest = self.df.loc[:, "EndingMarketValue"].idxmax()
+        self.assertEqual(exact.loc[f"Company {largest}", "EndingMarketValue"],
+                         self.df.loc[largest, "EndingMarketValue"])
+
+    def test_small_budgets_bound_the_top_holdings(self):
+        '''
+        Test that a budget smaller than twice topN still bounds the points and counts every holding
+        '''
+        for maxPoints in [30, 5, 1]:
+            points = self.benchmark.scatter_points("2016", maxPoints=maxPoints, topN=20)
+            self.assertLessEqual(len(points.index), maxPoints)
+            self.assertEqual(points.loc[:, "Count"].sum(), 2000)
+        with self.assertRaises(BenchmarkException):
+            self.benchmark.scatter_points("2016", maxPoints=0)
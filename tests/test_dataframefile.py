@@ -5,6 +5,7 @@ from unittest import (
     mock,
 )
 import os
+import tempfile
 
 import pandas as pd
 
@@ -80,3 +81,163 @@ class TestWrite(TestCase):
             assert fd.readline() == '0,1,2,3\n'
 
         os.remove(fullFilename)
+
+
+class TestCache(TestCase):
+    '''
+    Test reading through the parsed frame cache of DataFrameFile
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary directory holding a csv file and the cache folder
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.fileName = os.path.join(self.tmpDir.name, "2012EquityPositions.csv")
+        self.cacheDir = os.path.join(self.tmpDir.name, "cache")
+        with open(self.fileName, "w") as fd:
+            fd.write("Stocks,EndingMarketValue\nCONSOL STOCK A,9959220\n")
+
+    def tearDown(self):
+        '''
+        Removes the temporary directory
+        '''
+        self.tmpDir.cleanup()
+
+    def test_second_read_skips_parsing(self):
+        '''
+        Test that an unchanged file is loaded from the cache with its types
+        '''
+        expected = DataFrameFile(cacheDir=self.cacheDir).read(self.fileName)
+        with mock.patch("ffequity.utils.dataframefile.pd.read_csv") as readCsv:
+            results = DataFrameFile(cacheDir=self.cacheDir).read(self.fileName)
+            readCsv.assert_not_called()
+        pd.testing.assert_frame_equal(results, expected)
+
+    def test_touched_file_reuses_cache(self):
+        '''
+        Test that a file with a new mtime but the same content is not parsed again
+        '''
+        DataFrameFile(cacheDir=self.cacheDir).read(self.fileName)
+        os.utime(self.fileName, ns=(0, 0))
+        with mock.patch("ffequity.utils.dataframefile.pd.read_csv") as readCsv:
+            DataFrameFile(cacheDir=self.cacheDir).read(self.fileName)
+            readCsv.assert_not_called()
+
+    def test_changed_file_is_parsed_again(self):
+        '''
+        Test that a file whose content changed is parsed instead of read from the cache
+        '''
+        DataFrameFile(cacheDir=self.cacheDir).read(self.fileName)
+        with open(self.fileName, "w") as fd:
+            fd.write("Stocks,EndingMarketValue\nCONSOL STOCK A,1\nENI OPTION B,2\n")
+        results = DataFrameFile(cacheDir=self.cacheDir).read(self.fileName)
+        self.assertEqual(results.loc[:, "EndingMarketValue"].tolist(), [1, 2])
+
+
+class TestAggregate(TestCase):
+    '''
+    Test the aggregate() function from DataFrameFile
+    '''
+
+    def test_sums_lots_across_chunks(self):
+        '''
+        Test that lots of the same stock in different chunks collapse to one row in order of first appearance
+        '''
+        textStream = StringIO("Stocks,EndingMarketValue,Lot\nCONSOL STOCK A,1,x\nENI OPTION B,2,y\n"
+                              "CONSOL STOCK A,3,z\n,4,w\nENI OPTION B,5,v\n")
+        results, total = DataFrameFile().aggregate(textStream, chunkSize=2)
+        self.assertEqual(results.loc[:, "Stocks"].tolist()[:2], ["CONSOL STOCK A", "ENI OPTION B"])
+        self.assertEqual(results.loc[:, "EndingMarketValue"].tolist(), [4, 7, 4])
+        self.assertEqual(results.loc[:, "Lot"].tolist(), ["x", "y", "w"])
+        # lots without a stock name keep a row of their own, so the frame adds up to the running total
+        self.assertTrue(pd.isna(results.loc[2, "Stocks"]))
+        assert total == 15
+        assert results.loc[:, "EndingMarketValue"].sum() == total
+
+    def test_total_reads_one_column(self):
+        '''
+        Test that total() sums the market value column of a file without a Stocks column
+        '''
+        textStream = StringIO("Holding,EndingMarketValue\nCONSOL STOCK A,1\nENI OPTION B,2\n,4\n")
+        self.assertEqual(DataFrameFile().total(textStream, chunkSize=2), 7)
+        with self.assertRaises(DataFrameFileException):
+            DataFrameFile().total(StringIO("Stocks,Value\nCONSOL STOCK A,1\n"))
+
+    def test_missing_column_raises_exception(self):
+        '''
+        Test that a file without the market value column raises a DataFrameFileException
+        '''
+        with self.assertRaises(DataFrameFileException):
+            DataFrameFile().aggregate(StringIO("Stocks,Value\nCONSOL STOCK A,1\n"))
+
+
+class TestStore(TestCase):
+    '''
+    Test the write_store() and query() functions from DataFrameFile
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary directory and two years of benchmarks written with a store
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.store = os.path.join(self.tmpDir.name, "results.sqlite")
+        self.dff = DataFrameFile(store=self.store)
+        self.benchmarks = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "PEAR INC"], "EndingMarketValue": [10.0, 5.0],
+                                        "Company(Company)": ["CONSOL Energy", None], "Coal(tCO2)": [4.0, None]})
+        self.dff.write("2012benchmarks", path=self.tmpDir.name, data=self.benchmarks)
+        self.dff.write("2013benchmarks", path=self.tmpDir.name,
+                       data=pd.DataFrame({"Stocks": ["CONSOL STOCK A"], "EndingMarketValue": [8.0],
+                                          "Company(Company)": ["CONSOL Energy"], "Coal(tCO2)": [9.0]}))
+
+    def tearDown(self):
+        '''
+        Removes the temporary directory
+        '''
+        self.tmpDir.cleanup()
+
+    def test_written_years_can_be_queried(self):
+        '''
+        Test that the rows written are stored by year next to the csv files and filtered by the store
+        '''
+        assert os.path.exists(os.path.join(self.tmpDir.name, "2012benchmarks.csv"))
+        results = self.dff.query("benchmarks")
+        self.assertEqual(results.columns.tolist(), ["Year", "Portfolio"] + self.benchmarks.columns.tolist())
+        self.assertEqual(results.loc[:, "Year"].tolist(), ["2012", "2012", "2013"])
+        assert pd.isnull(results.loc[1, "Coal(tCO2)"])
+        results = self.dff.query("benchmarks", companies=["CONSOL Energy"], where='"Coal(tCO2)" > ?', params=(5,),
+                                 columns=["Year"])
+        self.assertEqual(results.loc[:, "Year"].tolist(), ["2013"])
+        results = self.dff.query("benchmarks", years=[2012], orderBy="EndingMarketValue", limit=1)
+        self.assertEqual(results.loc[:, "Stocks"].tolist(), ["PEAR INC"])
+
+    def test_rewritten_year_replaces_its_rows(self):
+        '''
+        Test that writing a year again replaces its rows, adding any new columns to the table
+        '''
+        self.dff.write_store("benchmarks", pd.DataFrame({"Stocks": ["ENI OPTION B"], "Oil(tCO2)": [3.0]}),
+                             year="2012")
+        results = self.dff.query("benchmarks", years=["2012"])
+        self.assertEqual(results.loc[:, "Stocks"].tolist(), ["ENI OPTION B"])
+        self.assertEqual(results.loc[0, "Oil(tCO2)"], 3.0)
+        self.assertEqual(len(self.dff.query("benchmarks", years=["2013"]).index), 1)
+
+    def test_portfolios_share_the_store(self):
+        '''
+        Test that the frames written for another portfolio are kept under its name alongside the first
+        '''
+        pension = DataFrameFile(store=self.store, portfolio="pension")
+        pension.write("2012benchmarks", path=self.tmpDir.name, data=self.benchmarks.iloc[:1])
+        results = self.dff.query("benchmarks", years=["2012"], orderBy="Portfolio")
+        self.assertEqual(results.loc[:, "Portfolio"].tolist(), ["", "", "pension"])
+        self.assertEqual(len(pension.query("benchmarks", portfolios=["pension"]).index), 1)
+
+    def test_missing_table_raises_exception(self):
+        '''
+        Test that querying a table that was never written raises a DataFrameFileException
+        '''
+        with self.assertRaises(DataFrameFileException):
+            self.dff.query("assessment")
+        with self.assertRaises(DataFrameFileException):
+            DataFrameFile().query("benchmarks")
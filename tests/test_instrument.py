@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+from unittest import (
+    TestCase,
+    mock,
+)
+
+from ffequity.utils.instrument import (
+    Instrument,
+    InstrumentException,
+    peak_rss,
+    stage,
+)
+
+
+class TestStage(TestCase):
+    '''
+    Test the stage() function from Instrument
+    '''
+
+    def test_records_time_and_counts(self):
+        '''
+        Test that a stage records its timings, memory and the counts added inside it
+        '''
+        instrument = Instrument()
+        with instrument.stage("match_equity", "2012") as counts:
+            sum(range(10000))
+            counts.update(rows=3, comparisons=7)
+        record = instrument.records[0]
+        self.assertEqual((record["stage"], record["year"], record["rows"], record["comparisons"]),
+                         ("match_equity", "2012", 3, 7))
+        assert record["wall"] >= 0 and record["cpu"] >= 0
+        assert record["peakRss"] is None or record["peakRss"] > 0
+
+    def test_failed_stage_is_recorded(self):
+        '''
+        Test that a stage raising an exception is still recorded and the exception passed on
+        '''
+        instrument = Instrument()
+        with self.assertRaises(ValueError):
+            with instrument.stage("write", "2013"):
+                raise ValueError("disk full")
+        self.assertEqual(instrument.summary().index.tolist(), ["write"])
+
+    def test_peak_rss_units(self):
+        '''
+        Test that peak memory is read as kilobytes on linux and as bytes on macOS
+        '''
+        usage = mock.Mock(ru_maxrss=2048)
+        with mock.patch("resource.getrusage", return_value=usage):
+            with mock.patch("sys.platform", "linux"):
+                self.assertEqual(peak_rss(), 2048 * 1024)
+            with mock.patch("sys.platform", "darwin"):
+                self.assertEqual(peak_rss(), 2048)
+
+    def test_stage_without_instrument(self):
+        '''
+        Test that the stage() helper times with an instrument and does nothing without one
+        '''
+        instrument = Instrument()
+        with stage(instrument, "read", "2012") as counts:
+            counts["rows"] = 2
+        with stage(None, "read", "2012") as counts:
+            counts["rows"] = 3
+        self.assertEqual([record["rows"] for record in instrument.records], [2])
+
+
+class TestExport(TestCase):
+    '''
+    Test the to_json() and read_json() functions from Instrument
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary directory to write the records to
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpDir.name, "instrument.json")
+
+    def tearDown(self):
+        '''
+        Removes the temporary directory
+        '''
+        self.tmpDir.cleanup()
+
+    def test_records_survive_json(self):
+        '''
+        Test that records written as json read back as a dataframe with a row per stage
+        '''
+        instrument = Instrument()
+        for year in ["2012", "2013"]:
+            with instrument.stage("analyze_data", year) as counts:
+                counts.update(rows=int(year), file=year + "assessment.csv")
+        instrument.to_json(self.path)
+        df = Instrument.read_json(self.path)
+        self.assertEqual(df.loc[:, "year"].tolist(), ["2012", "2013"])
+        self.assertEqual(instrument.summary().loc["analyze_data", "rows"], 4025)
+        self.assertNotIn("file", instrument.summary().columns)
+
+    def test_other_file_raises_exception(self):
+        '''
+        Test that reading json that wasn't written by an Instrument raises InstrumentException
+        '''
+        with open(self.path, "w") as fd:
+            json.dump({"years": []}, fd)
+        with self.assertRaises(InstrumentException):
+            Instrument.read_json(self.path)
@@ -0,0 +1,70 @@
+import os
+import pickle
+import tempfile
+from unittest import TestCase
+
+from ffequity.utils.matchcache import (
+    MatchCache,
+    MatchCacheException,
+)
+
+
+class TestMatchCache(TestCase):
+    '''
+    Test the get(), put() and save() functions from MatchCache
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary directory to store the cache file
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpDir.name, "matchcache.pkl")
+
+    def tearDown(self):
+        '''
+        Removes the temporary directory storing the cache file
+        '''
+        self.tmpDir.cleanup()
+
+    def test_scores_survive_save_and_load(self):
+        '''
+        Test that saved scores are read back by a new cache on the same path
+        '''
+        cache = MatchCache(self.path)
+        cache.put(("v1", "consol energy", "a consol stock"), 100)
+        cache.save()
+        cache = MatchCache(self.path)
+        assert cache.get(("v1", "consol energy", "a consol stock")) == 100
+        assert cache.get(("v2", "consol energy", "a consol stock")) is None
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_evicts_least_recently_used(self):
+        '''
+        Test that the cache never holds more than maxEntries scores
+        '''
+        cache = MatchCache(self.path, maxEntries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(list(cache.scores), ["a", "c"])
+
+    def test_invalid_size_raises_exception(self):
+        '''
+        Test that a cache without room for a score raises MatchCacheException
+        '''
+        with self.assertRaises(MatchCacheException):
+            MatchCache(self.path, maxEntries=0)
+
+    def test_only_worker_copies_track_additions(self):
+        '''
+        Test that new scores are kept for the parent only by a copy of the cache sent to a worker process
+        '''
+        cache = MatchCache(self.path, maxEntries=2)
+        for key in ["a", "b", "c"]:
+            cache.put(key, 1)
+        self.assertEqual(cache.added, [])
+        workerCache = pickle.loads(pickle.dumps(cache))
+        workerCache.put("d", 2)
+        self.assertEqual(workerCache.added, [("d", 2)])
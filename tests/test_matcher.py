@@ -0,0 +1,83 @@
+from unittest import TestCase
+
+from fuzzywuzzy import fuzz
+
+from ffequity.processors.matcher import Matcher
+from ffequity.utils.matchcache import MatchCache
+
+
+carbonCompanies = ["CONSOL Energy", "Arch Coal", "Cloud Peak Energy", "Natural Resource Partners", "SunCoke Energy",
+                   "Coal India", "Royal Dutch Shell", "ConocoPhillips", "ENI", "BP", "Hess"]
+equityStocks = ["CONSOL STOCK A", "COAL INDIA", "SUNCOKE LTD", "ROYAL DUTCH SHELL", "ENI OPTION B", "CONOC PHILLIP",
+                "NRP", "CLOUD PEAK STOCK", "ROYAL DUTCH SHELL A", "CLOTHING UNITED A", "PEAR INC", "BPX", "H",
+                "ARCHCOAL", "", "WIGS R US"]
+
+
+class TestMatch(TestCase):
+    '''
+    Test the match() function from Matcher
+    '''
+
+    def brute_force(self, carbonCompany, thresh):
+        '''
+        Scores every stock against the carbon company like the original all-pairs loop
+        '''
+        matches = []
+        for position, equityCompany in enumerate(equityStocks):
+            matchRatio = fuzz.partial_token_set_ratio(equityCompany, carbonCompany)
+            if matchRatio >= thresh:
+                matches.append((position, matchRatio))
+        return matches
+
+    def test_matches_all_pairs_scoring(self):
+        '''
+        Test that blocking returns exactly the matches of scoring every pair
+        '''
+        for thresh in (90, 80):
+            matcher = Matcher(equityStocks, thresh=thresh)
+            for carbonCompany in carbonCompanies:
+                self.assertEqual(matcher.match(carbonCompany), self.brute_force(carbonCompany, thresh))
+
+    def test_matches_without_shared_token(self):
+        '''
+        Test that names split differently still match through the n-gram index
+        '''
+        matcher = Matcher(equityStocks)
+        self.assertIn((5, 92), matcher.match("ConocoPhillips"))
+
+    def test_prunes_comparisons(self):
+        '''
+        Test that fewer pairs are scored than in the all-pairs loop
+        '''
+        matcher = Matcher(equityStocks)
+        for carbonCompany in carbonCompanies:
+            matcher.match(carbonCompany)
+        assert matcher.comparisons < len(carbonCompanies) * len(equityStocks)
+
+
+class TestMatchAll(TestCase):
+    '''
+    Test the match_all() function from Matcher
+    '''
+
+    def test_parallel_matches_serial(self):
+        '''
+        Test that sharding the carbon companies across processes returns the serial matches in order
+        '''
+        serial = Matcher(equityStocks).match_all(carbonCompanies)
+        matcher = Matcher(equityStocks)
+        parallel = matcher.match_all(carbonCompanies, workers=2, chunkSize=3)
+        self.assertEqual(parallel, serial)
+        assert matcher.comparisons > 0
+
+    def test_cache_skips_scored_pairs(self):
+        '''
+        Test that pairs scored in an earlier run are read from the cache instead of scored again
+        '''
+        cache = MatchCache("unused.pkl")
+        first = Matcher(equityStocks, cache=cache)
+        expected = first.match_all(carbonCompanies, workers=2, chunkSize=3)
+        assert first.comparisons > 0 and len(cache.scores) == first.comparisons
+        second = Matcher(equityStocks, cache=cache)
+        self.assertEqual(second.match_all(carbonCompanies), expected)
+        assert second.comparisons == 0
@@ -0,0 +1,67 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from ffequity.processors.panel import (
+    Panel,
+    PanelException,
+    keys_by_year,
+)
+
+
+class TestPanel(TestCase):
+    '''
+    Test the Panel class and keys_by_year() function
+    '''
+
+    def setUp(self):
+        '''
+        Sets up dfs with carbon data for three years and equity data for one
+        '''
+        self.dfs = {
+            "2014carbon_data": pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI"], "Coal(GtCO2)": [3.0, 0.0]}),
+            "2012carbon_data": pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI"], "Coal(GtCO2)": [1.0, 2.0]}),
+            "2013carbon_data": pd.DataFrame({"Company(Company)": ["CONSOL Energy"], "Coal(GtCO2)": [2.0]}),
+            "2013equity_data": pd.DataFrame({"Stocks": ["CONSOL STOCK A"], "EndingMarketValue": [1.0]}),
+        }
+
+    def test_keys_by_year(self):
+        '''
+        Test that the years of dfs are found in order, for every folder or for one
+        '''
+        self.assertEqual(list(keys_by_year(self.dfs)), ["2012", "2013", "2014"])
+        self.assertEqual(keys_by_year(self.dfs)["2013"], ["2013carbon_data", "2013equity_data"])
+        self.assertEqual(list(keys_by_year(self.dfs, "equity_data")), ["2013"])
+
+    def test_years_and_ranges(self):
+        '''
+        Test that one year or a range of years can be taken back out of the panel unchanged
+        '''
+        panel = Panel.from_dfs(self.dfs, "carbon_data")
+        self.assertEqual(panel.years(), ["2012", "2013", "2014"])
+        self.assertEqual(panel.df.columns.tolist(), ["Year", "Row"] + self.dfs["2014carbon_data"].columns.tolist())
+        pd.testing.assert_frame_equal(panel.year("2014").drop(columns="Row"), self.dfs["2014carbon_data"])
+        self.assertEqual(panel.between("2013", "2014").years(), ["2013", "2014"])
+        self.assertEqual(panel.between(2015, 2020).years(), [])
+        self.assertEqual(list(panel.to_years()), ["2012", "2013", "2014"])
+        with self.assertRaises(PanelException):
+            panel.year("2011")
+
+    def test_queries_across_years(self):
+        '''
+        Test the aggregates, percentiles and trends computed over every year at once
+        '''
+        panel = Panel.from_dfs(self.dfs, "carbon_data")
+        self.assertEqual(panel.aggregate(["Coal(GtCO2)"]).loc[:, "Coal(GtCO2)"].tolist(), [3.0, 2.0, 3.0])
+        self.assertEqual(panel.percentiles("Coal(GtCO2)").tolist(), [0.5, 1.0, 1.0, 1.0, 0.5])
+        trend = panel.trend("Coal(GtCO2)")
+        self.assertEqual(trend.loc["CONSOL Energy"].tolist(), [1.0, 2.0, 3.0])
+        self.assertTrue(np.isnan(trend.loc["ENI", "2013"]))
+
+    def test_missing_year_column_raises_exception(self):
+        '''
+        Test that a frame without a Year column raises PanelException
+        '''
+        with self.assertRaises(PanelException):
+            Panel(self.dfs["2012carbon_data"])
@@ -0,0 +1,71 @@
+from unittest import TestCase
+
+import pandas as pd
+
+from ffequity.processors.analyst import Analyst
+from ffequity.processors.portfolio import (
+    PortfolioBatch,
+    PortfolioBatchException,
+)
+
+
+class TestAnalyze(TestCase):
+    '''
+    Test the analyze() function from PortfolioBatch
+    '''
+
+    def setUp(self):
+        '''
+        Sets up two portfolios sharing a stock, with carbon and financial data for three companies
+        '''
+        self.portfolios = {
+            "pension": pd.DataFrame({"Stocks": ["CONSOL STOCK A", "ENI OPTION B", "PEAR INC"],
+                                     "EndingMarketValue": [10.0, 20.0, 40.0]}),
+            "endowment": pd.DataFrame({"Stocks": ["CONSOL STOCK A", "CONSOL ENERGY", "HESS"],
+                                       "EndingMarketValue": [5.0, 5.0, 30.0]}),
+        }
+        self.carbon = pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI", "Hess"],
+                                    "Coal(GtCO2)": [2.0, 0.0, 0.0], "Oil(GtCO2)": [0.0, 3.0, 1.0],
+                                    "Gas(GtCO2)": [0.0, 1.0, 0.0]})
+        self.financial = pd.DataFrame({"Company(Company)": ["CONSOL Energy", "ENI", "Hess"],
+                                       "MarketCap(B)": [4.0, 2.0, 0.0]})
+
+    def test_matches_per_portfolio_analysis(self):
+        '''
+        Test that each portfolio's carbon and equity equal what analyze_year gives for it alone
+        '''
+        analyst = Analyst({})
+        results = PortfolioBatch(analyst).analyze("2012", self.portfolios, self.carbon, self.financial)
+        self.assertEqual(results.index.tolist(), ["pension", "endowment"])
+        for name, equity in self.portfolios.items():
+            matchedDf = analyst.match_finance("2012", analyst.match_equity("2012", equity, self.carbon),
+                                              self.financial)
+            df = analyst.analyze_year("2012", matchedDf)
+            for fuel in ["Coal", "Oil", "Gas"]:
+                self.assertAlmostEqual(results.loc[name, fuel + "(tCO2)"], df.loc[:, fuel + "(tCO2)"].sum())
+            self.assertEqual(results.loc[name, "Fossil Fuel Equity"], df.loc[:, "EndingMarketValue"].sum())
+        self.assertEqual(results.loc[:, "EndingMarketValue"].tolist(), [70.0, 40.0])
+        self.assertEqual(results.loc["pension", "Oil Equity"], 15.0)
+        self.assertEqual(results.loc[:, "Oil(tCO2)Pctile"].tolist(), [1.0, 0.5])
+
+    def test_each_stock_name_matched_once(self):
+        '''
+        Test that a stock held by several portfolios is matched only once, without replacing the analyst's stats
+        '''
+        analyst = Analyst({})
+        runStats = {"exact": 1, "fuzzy": 0, "unmatched": 0, "comparisons": 0}
+        analyst.matchStats["2012"] = runStats
+        batch = PortfolioBatch(analyst)
+        batch.analyze("2012", self.portfolios, self.carbon, self.financial)
+        matchStats = batch.matchStats["2012"]
+        self.assertEqual(matchStats["exact"] + matchStats["fuzzy"] + matchStats["unmatched"], 5)
+        self.assertEqual(sum(batch.financeStats["2012"].values()), 3)
+        self.assertIs(analyst.matchStats["2012"], runStats)
+        self.assertNotIn("2012", analyst.financeStats)
+
+    def test_no_portfolios_raises_exception(self):
+        '''
+        Test that an empty batch raises a PortfolioBatchException
+        '''
+        with self.assertRaises(PortfolioBatchException):
+            PortfolioBatch(Analyst({})).analyze("2012", {}, self.carbon, self.financial)
@@ -0,0 +1,78 @@
+import os
+import tempfile
+from unittest import (
+    TestCase,
+    mock,
+)
+
+import numpy as np
+import pandas as pd
+
+from ffequity.processors.benchmark import Benchmark
+from ffequity.processors.report import (
+    Report,
+    ReportException,
+    export_reports,
+)
+
+
+class TestExportReports(TestCase):
+    '''
+    Test the export_reports() function and Report class
+    '''
+
+    def setUp(self):
+        '''
+        Sets up two portfolios with a year of benchmark data and their aggregate tables
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.benchmarks = {}
+        for name, scale in [("pension", 1.0), ("endowment", 2.0)]:
+            data = {"2013": pd.DataFrame({"Stocks": ["CONSOL STOCK A", "ENI OPTION B", "PEAR INC"],
+                                          "EndingMarketValue": [10.0 * scale, 20.0, 5.0],
+                                          "Company(Company)": ["CONSOL Energy", "ENI", np.nan],
+                                          "Coal(tCO2)": [4.0, 0.0, np.nan], "Oil(tCO2)": [0.0, 3.0, np.nan],
+                                          "Gas(tCO2)": [0.0, 1.0, np.nan]})}
+            benchmark = Benchmark(["2013"], data=data)
+            with mock.patch.object(Benchmark, "get_total_equity", return_value={"2013": 100.0}):
+                benchmark.aggregate_table()
+            self.benchmarks[name] = benchmark
+
+    def tearDown(self):
+        '''
+        Removes the temporary directory
+        '''
+        self.tmpDir.cleanup()
+
+    def test_writes_every_chart(self):
+        '''
+        Test that each portfolio gets a png per chart and year, and one pdf and html page
+        '''
+        written = export_reports(self.benchmarks, self.tmpDir.name, formats=("png", "pdf", "html"))
+        self.assertEqual(list(written), ["pension", "endowment"])
+        self.assertEqual(len(written["pension"]), 7)
+        for files in written.values():
+            for fileName in files:
+                self.assertGreater(os.path.getsize(fileName), 0)
+        self.assertIn(os.path.join(self.tmpDir.name, "endowment_scatterplot_2013.png"), written["endowment"])
+        with open(os.path.join(self.tmpDir.name, "pension.html")) as fd:
+            self.assertEqual(fd.read().count("<svg"), 5)
+
+    def test_process_pool_writes_the_same_files(self):
+        '''
+        Test that rendering on a process pool writes the files of the serial export
+        '''
+        serial = export_reports(self.benchmarks, os.path.join(self.tmpDir.name, "serial"))
+        pooled = export_reports(self.benchmarks, os.path.join(self.tmpDir.name, "pooled"), workers=2)
+        self.assertEqual({name: [os.path.basename(f) for f in files] for name, files in serial.items()},
+                         {name: [os.path.basename(f) for f in files] for name, files in pooled.items()})
+
+    def test_bad_reports_raise_exception(self):
+        '''
+        Test that unknown formats and portfolios without an aggregate table raise ReportException
+        '''
+        with self.assertRaises(ReportException):
+            Report(self.tmpDir.name, formats=("gif",))
+        self.benchmarks["pension"].aggregateTable = None
+        with self.assertRaises(ReportException):
+            export_reports(self.benchmarks, self.tmpDir.name)
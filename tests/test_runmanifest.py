@@ -0,0 +1,77 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import pandas as pd
+
+from ffequity.utils.runmanifest import (
+    RunManifest,
+    RunManifestException,
+)
+
+
+class TestRunManifest(TestCase):
+    '''
+    Test the is_current(), record() and save() functions from RunManifest
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary directory holding an output file and the manifest
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpDir.name, "runmanifest.json")
+        self.outputPath = os.path.join(self.tmpDir.name, "2012benchmarks.csv")
+        with open(self.outputPath, "w") as fd:
+            fd.write("Stocks,EndingMarketValue\nCONSOL STOCK A,9959220\n")
+        self.fingerprint = {"equity_data": "abc", "thresh": 90}
+
+    def tearDown(self):
+        '''
+        Removes the temporary directory
+        '''
+        self.tmpDir.cleanup()
+
+    def test_records_survive_save_and_load(self):
+        '''
+        Test that a recorded year is current in a manifest loaded from disk until its inputs change
+        '''
+        manifest = RunManifest(self.path)
+        assert not manifest.is_current("benchmarks", "2012", self.fingerprint, self.outputPath)
+        manifest.record("benchmarks", "2012", self.fingerprint, self.outputPath)
+        manifest.save()
+        loaded = RunManifest(self.path)
+        assert loaded.is_current("benchmarks", "2012", dict(self.fingerprint), self.outputPath)
+        assert not loaded.is_current("benchmarks", "2012", dict(self.fingerprint, thresh=80), self.outputPath)
+        assert not loaded.is_current("assessment", "2012", self.fingerprint, self.outputPath)
+
+    def test_changed_output_is_not_current(self):
+        '''
+        Test that an output rewritten or removed since it was recorded has to be recomputed
+        '''
+        manifest = RunManifest(self.path)
+        manifest.record("benchmarks", "2012", self.fingerprint, self.outputPath)
+        with open(self.outputPath, "a") as fd:
+            fd.write("ENI OPTION B,1\n")
+        assert not manifest.is_current("benchmarks", "2012", self.fingerprint, self.outputPath)
+        os.remove(self.outputPath)
+        assert not manifest.is_current("benchmarks", "2012", self.fingerprint, self.outputPath)
+
+    def test_hash_input_follows_content(self):
+        '''
+        Test that frames in memory are hashed by their content
+        '''
+        manifest = RunManifest(self.path)
+        dfs = {"2012equity_data": pd.DataFrame({"Stocks": ["CONSOL STOCK A"], "EndingMarketValue": [1.0]}),
+               "2013equity_data": pd.DataFrame({"Stocks": ["CONSOL STOCK A"], "EndingMarketValue": [2.0]})}
+        self.assertEqual(manifest.hash_input(dfs, "2012equity_data"), manifest.hash_input(dict(dfs), "2012equity_data"))
+        self.assertNotEqual(manifest.hash_input(dfs, "2012equity_data"), manifest.hash_input(dfs, "2013equity_data"))
+
+    def test_other_file_raises_exception(self):
+        '''
+        Test that loading a json file that isn't a manifest raises RunManifestException
+        '''
+        with open(self.path, "w") as fd:
+            fd.write("[]")
+        with self.assertRaises(RunManifestException):
+            RunManifest(self.path)
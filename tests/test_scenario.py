@@ -0,0 +1,71 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from ffequity.processors.analyst import Analyst
+from ffequity.processors.scenario import (
+    Scenarios,
+    ScenarioException,
+)
+
+
+class TestRun(TestCase):
+    '''
+    Test the run() function from Scenarios
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a year of matched data with a company held through two stocks and an unmatched stock
+        '''
+        self.analyst = Analyst({})
+        self.df = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "ENI OPTION B", "CONSOL STOCK B", "PEAR INC"],
+                                "EndingMarketValue": [10.0, 20.0, 30.0, 40.0],
+                                "Company(Company)": ["CONSOL Energy", "ENI", "CONSOL Energy", np.nan],
+                                "Coal(GtCO2)": [2.0, 1.0, 2.0, np.nan], "Oil(GtCO2)": [0.0, 3.0, 0.0, np.nan],
+                                "MarketCap(B)": [4.0, 2.0, 4.0, np.nan]})
+        self.financial = pd.DataFrame({"Company(Company)": ["ENI", "CONSOL Energy"], "MarketCap(B)": [2.0, 4.0]})
+
+    def test_baseline_scenario_matches_analyze_year(self):
+        '''
+        Test that the financial data's market caps give the (tCO2) and percentiles of analyze_year
+        '''
+        scenarios = Scenarios(self.analyst, self.df)
+        expected = self.analyst.analyze_year("2012", self.df.copy()).set_index("Company(Company)")
+        marketCaps = scenarios.market_caps(self.financial).values
+        results = pd.concat(scenarios.run([marketCaps])).xs(0, level="Scenario")
+        for col in ["Coal(tCO2)", "Oil(tCO2)", "Coal(tCO2)Pctile", "Oil(tCO2)Pctile"]:
+            self.assertEqual(results.loc[:, col].tolist(), expected.loc[results.index, col].tolist())
+
+    def test_scenarios_stream_in_chunks(self):
+        '''
+        Test that scenarios are handed out in chunks, with shocked and zero market caps
+        '''
+        marketCaps = pd.DataFrame({"ENI": [2.0, 4.0, 0.0], "CONSOL Energy": [4.0, 8.0, 4.0]},
+                                  index=["base", "double", "eni gone"])
+        chunks = list(Scenarios(self.analyst, self.df, chunkSize=2).run(marketCaps))
+        self.assertEqual([len(chunk.index) for chunk in chunks], [4, 2])
+        results = pd.concat(chunks)
+        self.assertEqual(results.loc[("double", "CONSOL Energy"), "Coal(tCO2)"], 10.0)
+        assert np.isnan(results.loc[("eni gone", "ENI"), "Coal(tCO2)"])
+        self.assertEqual(results.loc[("eni gone", "CONSOL Energy"), "Coal(tCO2)Pctile"], 1.0)
+
+    def test_write_streams_to_csv(self):
+        '''
+        Test that write() puts every chunk in one csv under a single header
+        '''
+        with tempfile.TemporaryDirectory() as tmpDir:
+            fileName = os.path.join(tmpDir, "scenarios.csv")
+            Scenarios(self.analyst, self.df, chunkSize=1).write(fileName, np.ones((3, 2)))
+            results = pd.read_csv(fileName)
+        self.assertEqual(results.loc[:, "Scenario"].tolist(), [0, 0, 1, 1, 2, 2])
+
+    def test_wrong_number_of_companies_raises_exception(self):
+        '''
+        Test that market caps for the wrong number of companies raise a ScenarioException
+        '''
+        with self.assertRaises(ScenarioException):
+            list(Scenarios(self.analyst, self.df).run(np.ones((2, 3))))
@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+import numpy as np
+import pandas as pd
+
+from ffequity.processors.schema import (
+    Schema,
+    SchemaException,
+)
+
+
+class TestApply(TestCase):
+    '''
+    Test the apply() function from Schema
+    '''
+
+    def test_converts_declared_columns(self):
+        '''
+        Test that market values, market caps and fuels become floats and names are left as read
+        '''
+        df = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "COAL " + "INDIA", None],
+                           "Company(Company)": ["CONSOL Energy", "Coal India", "Coal India"],
+                           "EndingMarketValue": ["9959220", None, "7"],
+                           "MarketCap(B)": [3.7, 130, None],
+                           "Coal(GtCO2)": [2, 5, 5],
+                           "Portfolio": ["a", "b", "c"]})
+        results = Schema(floatType="float32").apply(df)
+        for col in ["EndingMarketValue", "MarketCap(B)", "Coal(GtCO2)"]:
+            self.assertEqual(results[col].dtype, np.float32)
+        assert np.isnan(results.loc[1, "EndingMarketValue"])
+        self.assertEqual(results.loc[:, "Company(Company)"].tolist(), ["CONSOL Energy", "Coal India", "Coal India"])
+        assert results.loc[2, "Stocks"] is None or np.isnan(results.loc[2, "Stocks"])
+        self.assertEqual(results.loc[:, "Portfolio"].tolist(), ["a", "b", "c"])
+        # the frame passed in is left as it was
+        self.assertEqual(df.loc[0, "EndingMarketValue"], "9959220")
+
+    def test_malformed_cell_raises_exception(self):
+        '''
+        Test that a number that cannot be parsed raises a SchemaException naming the file and row
+        '''
+        df = pd.DataFrame({"Stocks": ["CONSOL STOCK A", "COAL INDIA"],
+                           "EndingMarketValue": ["9959220", "$7,007,408"]})
+        with self.assertRaisesRegex(SchemaException, r"2012EquityPositions.csv.*\[1\]"):
+            Schema().apply(df, source="2012EquityPositions.csv")
+
+    def test_rejects_non_float_type(self):
+        '''
+        Test that asking for integer numbers raises a SchemaException
+        '''
+        with self.assertRaises(SchemaException):
+            Schema(floatType="int64")
@@ -5,13 +5,17 @@ from unittest import (
     mock,
 )
 import os
+import tempfile
 
+import numpy as np
 import pandas as pd
 
-from ffequity.utils.validator import (
+from ffequity.processors.validator import (
     Validator,
     ValidatorException,
 )
+from ffequity.processors.schema import Schema, SchemaException
+from ffequity.utils.dataframefile import DataFrameFile
 
 class TestValidateFolders(TestCase):
     '''
@@ -41,3 +45,97 @@ class TestValidateFolders(TestCase):
         validator = Validator(folderNames)
         # create an empty directory for carbon_data only and see if
         # ValidatorException is raised
+
+
+class TestValidateData(TestCase):
+    '''
+    Tests the validate_data() function from Validator
+    '''
+
+    def setUp(self):
+        '''
+        Sets up a temporary data directory with equity and carbon csv files for two years
+        '''
+        self.tmpDir = tempfile.TemporaryDirectory()
+        for folder, header in [("equity_data", "Stocks,EndingMarketValue"),
+                               ("carbon_data", "Company(Company),Coal(GtCO2)")]:
+            os.mkdir(os.path.join(self.tmpDir.name, folder))
+            for year in ["2013", "2014"]:
+                with open(os.path.join(self.tmpDir.name, folder, year + folder + ".csv"), "w") as fd:
+                    fd.write(header + "\nCONSOL,1\n")
+
+    def tearDown(self):
+        '''
+        Removes the temporary data directory
+        '''
+        self.tmpDir.cleanup()
+
+    def test_frames_load_on_first_use(self):
+        '''
+        Tests that validate() returns every file's key but only reads the files that are used
+        '''
+        validator = Validator(['equity_data', 'carbon_data'], dataPath=self.tmpDir.name)
+        dfs = validator.validate(DataFrameFile())
+        self.assertEqual(sorted(dfs), ["2013carbon_data", "2013equity_data", "2014carbon_data", "2014equity_data"])
+        self.assertEqual(dfs.loaded(), [])
+        assert dfs["2014equity_data"].loc[0, "EndingMarketValue"] == 1
+        self.assertEqual(dfs.loaded(), ["2014equity_data"])
+        with self.assertRaises(KeyError):
+            dfs["2012equity_data"]
+
+    def test_manifest_records_each_file(self):
+        '''
+        Tests that the manifest holds the year, folder, path, size and mtime of every file
+        '''
+        validator = Validator(['equity_data', 'carbon_data'], dataPath=self.tmpDir.name, years=["2014"])
+        manifest = validator.get_manifest()
+        assert len(manifest) == 4
+        assert all(entry["size"] > 0 and entry["mtime"] > 0 for entry in manifest)
+        self.assertEqual(sorted(validator.validate(DataFrameFile())), ["2014carbon_data", "2014equity_data"])
+
+    def test_missing_folder_raises_exception(self):
+        '''
+        Tests that validate_folders() raises ValidatorException if a required folder is missing
+        '''
+        validator = Validator(['equity_data', 'financial_data'], dataPath=self.tmpDir.name)
+        with self.assertRaises(ValidatorException):
+            validator.validate_folders()
+
+    def test_parallel_reads_match_lazy_reads(self):
+        '''
+        Tests that reading every file on a pool gives the same frames under the same keys
+        '''
+        lazy = Validator(['equity_data', 'carbon_data'], dataPath=self.tmpDir.name).validate(DataFrameFile())
+        for executor in ["thread", "process"]:
+            validator = Validator(['equity_data', 'carbon_data'], dataPath=self.tmpDir.name, workers=2,
+                                  maxInflightBytes=1, executor=executor)
+            dfs = validator.validate(DataFrameFile())
+            self.assertEqual(sorted(dfs.loaded()), sorted(lazy))
+            for key in lazy:
+                pd.testing.assert_frame_equal(dfs[key], lazy[key])
+
+    def test_aggregate_equity_collapses_stocks(self):
+        '''
+        Tests that equity files are streamed into one row per stock with their totals recorded
+        '''
+        with open(os.path.join(self.tmpDir.name, "equity_data", "2014equity_data.csv"), "a") as fd:
+            fd.write("CONSOL,2\nENI,3\n")
+        validator = Validator(['equity_data', 'carbon_data'], dataPath=self.tmpDir.name, aggregateEquity=True,
+                              chunkSize=1)
+        dfs = validator.validate(DataFrameFile())
+        self.assertEqual(dfs["2014equity_data"].loc[:, "EndingMarketValue"].tolist(), [3, 3])
+        self.assertEqual(dfs.totals, {"2014equity_data": 6})
+        self.assertEqual(dfs.year_totals(), {"2014": 6})
+        self.assertEqual(len(dfs["2014carbon_data"].index), 1)
+
+    def test_schema_converts_frames_as_read(self):
+        '''
+        Tests that a schema converts each frame as it is read and rejects malformed files when they are read
+        '''
+        with open(os.path.join(self.tmpDir.name, "carbon_data", "2014carbon_data.csv"), "a") as fd:
+            fd.write("ENI,1.2.3\n")
+        validator = Validator(['equity_data', 'carbon_data'], dataPath=self.tmpDir.name, schema=Schema())
+        dfs = validator.validate(DataFrameFile())
+        self.assertEqual(dfs["2013equity_data"].loc[:, "EndingMarketValue"].dtype, np.float64)
+        with self.assertRaises(SchemaException):
+            dfs["2014carbon_data"]